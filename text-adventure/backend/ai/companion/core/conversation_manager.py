@@ -76,6 +76,11 @@ class ConversationManager:
             r"what was that again"
         ]
         
+        # Compile each pattern list into a single alternation so detection
+        # scans the input once per list instead of once per pattern
+        self._clarification_regex = re.compile("|".join(f"(?:{p})" for p in self.clarification_patterns))
+        self._follow_up_regex = re.compile("|".join(f"(?:{p})" for p in self.follow_up_patterns))
+        
         logger.debug("Initialized ConversationManager with config: %s", self.tier_specific_config)
     
     async def get_or_create_context(self, conversation_id: str) -> Dict[str, Any]:
@@ -167,15 +172,16 @@ class ConversationManager:
         # Get the player's input in lowercase for pattern matching
         player_input = request.player_input.lower()
         
-        # Check for clarification patterns
-        for pattern in self.clarification_patterns:
-            if re.search(pattern, player_input):
+        # Inputs this short are too short for the clarification and follow-up
+        # patterns, so only the entity check below applies to them
+        if len(player_input.strip()) >= 3:
+            # Check for clarification patterns
+            if self._clarification_regex.search(player_input):
                 logger.debug(f"Detected clarification request: {player_input}")
                 return ConversationState.CLARIFICATION
-        
-        # Check for follow-up patterns
-        for pattern in self.follow_up_patterns:
-            if re.search(pattern, player_input):
+            
+            # Check for follow-up patterns
+            if self._follow_up_regex.search(player_input):
                 logger.debug(f"Detected follow-up question: {player_input}")
                 return ConversationState.FOLLOW_UP
         
@@ -226,13 +232,16 @@ class ConversationManager:
                 # Handle both old type/text format and new role/content format
                 if "role" in entry and "content" in entry:
                     # New format
-                    prompt += f'  {{"role": "{entry.get("role")}", "content": "{entry.get("content", "").replace("\"", "\\\"")}"}},'
+                    content = entry.get("content", "").replace('"', '\\"')
+                    prompt += f'  {{"role": "{entry.get("role")}", "content": "{content}"}},'
                 elif "type" in entry:
-                    # Old format
+                    # Old format; backslashes are not allowed inside f-string
+                    # expressions before Python 3.12, so escape the text first
+                    text = entry.get("text", "").replace('"', '\\"')
                     if entry.get("type") == "user_message":
-                        prompt += f'  {{"role": "user", "content": "{entry.get("text", "").replace("\"", "\\\"")}"}},'
+                        prompt += f'  {{"role": "user", "content": "{text}"}},'
                     elif entry.get("type") == "assistant_message":
-                        prompt += f'  {{"role": "assistant", "content": "{entry.get("text", "").replace("\"", "\\\"")}"}},'
+                        prompt += f'  {{"role": "assistant", "content": "{text}"}},'
                 prompt += "\n"
             
             # Remove trailing comma and close the array
@@ -270,31 +279,27 @@ class ConversationManager:
             "Use the async version with conversation_id instead."
         )
     
-    async def add_to_history(
+    def _build_turn_entries(
         self,
-        conversation_id: str,
         request: ClassifiedRequest,
         response: str
-    ) -> List[Dict[str, Any]]:
+    ) -> Tuple[Dict[str, Any], Dict[str, Any]]:
         """
-        Add a request-response pair to the conversation history stored by ID.
+        Build the history entries for a request-response pair.
         
         Args:
-            conversation_id: The ID of the conversation
             request: The current request
             response: The response to the request
-        
+            
         Returns:
-            The updated conversation history
+            The user entry and the assistant entry
         """
-        logger.debug(f"Adding request-response pair to history for conversation {conversation_id}")
-        
         # Create a user message entry
         user_entry = {
             "type": "user_message",
             "text": request.player_input,
             "timestamp": request.timestamp.isoformat() if hasattr(request, 'timestamp') else datetime.now().isoformat(),
-            "intent": request.intent.value if hasattr(request, 'intent') else None,
+            "intent": request.intent.value if getattr(request, 'intent', None) else None,
             "entities": request.extracted_entities if hasattr(request, 'extracted_entities') else {}
         }
         
@@ -305,6 +310,29 @@ class ConversationManager:
             "timestamp": datetime.now().isoformat()
         }
         
+        return user_entry, assistant_entry
+    
+    async def add_to_history(
+        self,
+        conversation_id: str,
+        request: ClassifiedRequest,
+        response: str
+    ) -> List[Dict[str, Any]]:
+        """
+        Add a request-response pair to the conversation history stored by ID.
+        
+        Args:
+            conversation_id: The ID of the conversation
+            request: The current request
+            response: The response to the request
+        
+        Returns:
+            The updated conversation history
+        """
+        logger.debug(f"Adding request-response pair to history for conversation {conversation_id}")
+        
+        user_entry, assistant_entry = self._build_turn_entries(request, response)
+        
         # Get the current conversation context or create a new one
         context = await self.get_or_create_context(conversation_id)
         logger.debug(f"Retrieved context for {conversation_id} with {len(context.get('entries', []))} existing entries")
@@ -353,8 +381,9 @@ class ConversationManager:
         Returns:
             The response and the updated conversation history
         """
-        # Get the conversation history
-        conversation_history = await self.get_entries(conversation_id)
+        # Load the conversation once for the whole turn
+        context, turn_handle = await self.storage.begin_turn(conversation_id)
+        conversation_history = context.get("entries", [])
         
         # Detect the conversation state
         state = self.detect_conversation_state(request, conversation_history)
@@ -370,14 +399,11 @@ class ConversationManager:
         # Generate a response
         response = await generate_response_func(contextual_prompt)
         
-        # Add the request and response to the history
-        updated_history = await self.add_to_history(
-            conversation_id,
-            request,
-            response
-        )
+        # Add the request and response to the history in a single write
+        user_entry, assistant_entry = self._build_turn_entries(request, response)
+        updated_context = await self.storage.commit_turn(turn_handle, [user_entry, assistant_entry])
         
-        return response, updated_history
+        return response, updated_context.get("entries", [])
     
     async def cleanup_old_conversations(self, max_age_days: int = 30) -> int:
         """
@@ -7,16 +7,36 @@ for modular and configurable NPC behaviors.
 """
 
 import json
-import os
 import random
 import logging
 from typing import Dict, Any, List, Optional
 from dataclasses import dataclass, field
 
 from backend.ai.companion.core.models import ClassifiedRequest, IntentCategory
+from backend.ai.companion.core.npc.profile_loader import ProfileLoader
 
 logger = logging.getLogger(__name__)
 
+# Placement flags for the personality elements of a formatted response
+_EMOTION_SUFFIX = 1
+_EMOTION_PREFIX = 2
+_PHRASE_SUFFIX = 4
+_PHRASE_PREFIX = 8
+
+# Response layouts keyed by placement mask; a prefixed common phrase
+# replaces the emotion expression
+_RESPONSE_LAYOUTS = {
+    0: "{name}: {response}",
+    _EMOTION_SUFFIX: "{name}: {response} {emotion}",
+    _EMOTION_PREFIX: "{name}: {emotion} {response}",
+    _PHRASE_SUFFIX: "{name}: {response} {phrase}",
+    _EMOTION_SUFFIX | _PHRASE_SUFFIX: "{name}: {response} {emotion} {phrase}",
+    _EMOTION_PREFIX | _PHRASE_SUFFIX: "{name}: {emotion} {response} {phrase}",
+    _PHRASE_PREFIX: "{name}: {phrase} {response}",
+    _EMOTION_SUFFIX | _PHRASE_PREFIX: "{name}: {phrase} {response}",
+    _EMOTION_PREFIX | _PHRASE_PREFIX: "{name}: {phrase} {response}",
+}
+
 
 class NPCProfile:
     """
@@ -69,6 +89,10 @@ class NPCProfile:
         # Set default emotion expressions if not provided
         if not self.emotion_expressions:
             self._set_default_emotion_expressions()
+        
+        # Expressions the emotion lookup was built from; it is built on first
+        # use and rebuilt whenever emotion_expressions is replaced
+        self._indexed_expressions = None
             
         logger.debug(f"Created NPC profile: {self.profile_id} ({self.name}, {self.role})")
     
@@ -185,17 +209,12 @@ Remember to always stay in character and respond as {self.name} would.
             A string with an appropriate expression, or a fallback if the 
             emotion isn't defined
         """
-        if emotion in self.emotion_expressions and self.emotion_expressions[emotion]:
-            return random.choice(self.emotion_expressions[emotion])
-        
-        # Fallback to neutral or any available emotion
-        if "neutral" in self.emotion_expressions and self.emotion_expressions["neutral"]:
-            return random.choice(self.emotion_expressions["neutral"])
+        if self.emotion_expressions is not self._indexed_expressions:
+            self._index_emotion_expressions()
         
-        # Last resort fallback
-        for expressions in self.emotion_expressions.values():
-            if expressions:
-                return random.choice(expressions)
+        expressions = self._emotion_index.get(emotion) or self._fallback_expressions
+        if expressions:
+            return random.choice(expressions)
         
         # If no expressions are available
         return f"*{self.name} acknowledges*"
@@ -217,25 +236,23 @@ Remember to always stay in character and respond as {self.name} would.
         
         # Get a common phrase based on the personality traits
         common_phrase = None
-        if random.random() < 0.3:  # 30% chance to add a common phrase
-            common_phrase = self.get_common_phrase()
-        
-        # Format the response with personality elements
-        formatted = f"{self.name}: {response}"
+        phrases = self.speech_patterns.get("common_phrases")
+        if phrases and random.random() < 0.3:  # 30% chance to add a common phrase
+            common_phrase = random.choice(phrases)
         
+        # Choose the layout of the personality elements
+        mask = 0
         if emotion_expr:
-            if random.random() < 0.5:  # 50% chance to put expression at the end
-                formatted += f" {emotion_expr}"
-            else:
-                formatted = f"{self.name}: {emotion_expr} {response}"
-        
+            mask |= _EMOTION_SUFFIX if random.random() < 0.5 else _EMOTION_PREFIX  # 50% chance to put expression at the end
         if common_phrase:
-            if random.random() < 0.3:  # 30% chance to add at the beginning
-                formatted = f"{self.name}: {common_phrase} {response}"
-            else:
-                formatted += f" {common_phrase}"
+            mask |= _PHRASE_PREFIX if random.random() < 0.3 else _PHRASE_SUFFIX  # 30% chance to add at the beginning
         
-        return formatted
+        return _RESPONSE_LAYOUTS[mask].format(
+            name=self.name,
+            response=response,
+            emotion=emotion_expr,
+            phrase=common_phrase
+        )
     
     def get_common_phrase(self) -> str:
         """
@@ -261,6 +278,25 @@ Remember to always stay in character and respond as {self.name} would.
         """
         return area in self.knowledge_areas
     
+    def _index_emotion_expressions(self):
+        """
+        Build the emotion lookup used by get_emotion_expression.
+        
+        The lookup is rebuilt when emotion_expressions is assigned a new dict;
+        changes made to the current dict in place are not picked up.
+        """
+        self._indexed_expressions = self.emotion_expressions
+        self._emotion_index = {
+            emotion: tuple(expressions)
+            for emotion, expressions in self.emotion_expressions.items()
+            if expressions
+        }
+        
+        # Fallback to neutral or any available emotion
+        self._fallback_expressions = self._emotion_index.get("neutral") or next(
+            iter(self._emotion_index.values()), ()
+        )
+    
     def _set_default_emotion_expressions(self):
         """Set default emotion expressions based on personality traits."""
         # Generic expressions for different formality levels
@@ -353,13 +389,7 @@ class NPCProfileRegistry:
         Args:
             directory_path: Path to directory containing profile JSON files
         """
-        from backend.ai.companion.core.npc.profile_loader import ProfileLoader
-        
-        if not os.path.exists(directory_path):
-            logger.warning(f"Profile directory not found: {directory_path}")
-            return
-        
-        # Create a ProfileLoader and load profiles
+        # Create a ProfileLoader and load profiles; it warns if the directory is missing
         self.profile_loader = ProfileLoader(directory_path)
         
         # Convert to NPCProfile objects and register them
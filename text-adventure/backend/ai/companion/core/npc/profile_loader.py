@@ -11,9 +11,6 @@ import logging
 import copy
 from typing import Dict, Any, Optional, List, Set
 
-# Import the NPCProfile class
-from backend.ai.companion.core.npc.profile import NPCProfile
-
 logger = logging.getLogger(__name__)
 
 
@@ -49,20 +46,24 @@ class ProfileLoader:
         First loads all base profiles (files starting with "base_"),
         then loads all concrete profiles, applying inheritance as needed.
         """
-        if not os.path.exists(self.profiles_directory):
+        try:
+            with os.scandir(self.profiles_directory) as it:
+                filepaths = sorted(
+                    entry.path for entry in it
+                    if entry.name.endswith(".json") and entry.is_file()
+                )
+        except FileNotFoundError:
             logger.warning(f"Profiles directory not found: {self.profiles_directory}")
             return
         
         # First, load all base profiles
-        for filename in os.listdir(self.profiles_directory):
-            if filename.startswith("base_") and filename.endswith(".json"):
-                filepath = os.path.join(self.profiles_directory, filename)
+        for filepath in filepaths:
+            if os.path.basename(filepath).startswith("base_"):
                 self._load_base_profile(filepath)
         
         # Then, load all concrete profiles
-        for filename in os.listdir(self.profiles_directory):
-            if not filename.startswith("base_") and filename.endswith(".json"):
-                filepath = os.path.join(self.profiles_directory, filename)
+        for filepath in filepaths:
+            if not os.path.basename(filepath).startswith("base_"):
                 self._load_profile(filepath)
     
     def _load_base_profile(self, file_path: str):
@@ -223,6 +224,8 @@ class ProfileLoader:
             return None
         
         if as_object:
+            # Imported here because the profile module imports this one
+            from backend.ai.companion.core.npc.profile import NPCProfile
             return NPCProfile.from_dict(profile)
         
         return profile 
\ No newline at end of file
@@ -39,6 +39,14 @@ class Processor(abc.ABC):
             The generated response
         """
         pass
+    
+    async def close(self) -> None:
+        """
+        Release any resources held by the processor, such as open connections.
+        
+        The default implementation does nothing.
+        """
+        pass
 
 
 class Tier1Processor(Processor):
@@ -219,6 +227,15 @@ class ProcessorFactory:
         """Clear the processor cache. Used primarily for testing."""
         cls._processors = {}
     
+    @classmethod
+    async def close_all(cls) -> None:
+        """Close all processors created by the factory."""
+        processors = list(cls._processors.values())
+        cls._processors = {}
+        
+        for processor in processors:
+            await processor.close()
+    
     def get_processor(self, tier: ProcessingTier) -> Processor:
         """
         Get a processor for the specified tier.
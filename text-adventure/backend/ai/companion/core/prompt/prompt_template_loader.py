@@ -8,12 +8,16 @@ supporting intent-specific prompts and profile-specific instructions.
 import os
 import json
 import logging
-from typing import Dict, Any, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional, Tuple
 
 from backend.ai.companion.core.models import IntentCategory
 
 logger = logging.getLogger(__name__)
 
+# Template keys for each intent, e.g. "VOCABULARY_HELP"
+_INTENT_KEYS: Dict[IntentCategory, str] = {intent: intent.value.upper() for intent in IntentCategory}
+
 
 class PromptTemplateLoader:
     """
@@ -34,6 +38,9 @@ class PromptTemplateLoader:
         self.templates = {}  # Stores loaded templates
         self.active_template_id = "default_prompts"  # Default template ID
         
+        # Built prompts keyed by (template ID, intent, profile ID)
+        self._prompt_cache: Dict[Tuple[str, IntentCategory, Optional[str]], str] = {}
+        
         # Load all templates
         self._load_all_templates()
         
@@ -42,15 +49,29 @@ class PromptTemplateLoader:
     def _load_all_templates(self):
         """
         Load all template files from the templates directory.
+        
+        Files are read and parsed in a thread pool and merged in order.
         """
         if not os.path.exists(self.templates_directory):
             logger.warning(f"Templates directory not found: {self.templates_directory}")
             return
         
-        for filename in os.listdir(self.templates_directory):
-            if filename.endswith(".json"):
-                filepath = os.path.join(self.templates_directory, filename)
-                self._load_template(filepath)
+        with os.scandir(self.templates_directory) as it:
+            file_paths = sorted(
+                entry.path for entry in it
+                if entry.name.endswith(".json") and entry.is_file()
+            )
+        
+        if not file_paths:
+            return
+        
+        max_workers = min(32, (os.cpu_count() or 1) * 4, len(file_paths))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(self._read_template, file_paths))
+        
+        for result in results:
+            if result:
+                self._store_template(*result)
     
     def _load_template(self, file_path: str):
         """
@@ -59,20 +80,45 @@ class PromptTemplateLoader:
         Args:
             file_path: Path to the template JSON file
         """
+        result = self._read_template(file_path)
+        if result:
+            self._store_template(*result)
+    
+    def _read_template(self, file_path: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """
+        Read and parse a template JSON file.
+        
+        Args:
+            file_path: Path to the template JSON file
+            
+        Returns:
+            A tuple of the template ID and data, or None if the file is invalid
+        """
         try:
             with open(file_path, 'r', encoding='utf-8') as f:
                 template_data = json.load(f)
-                template_id = template_data.get("template_id")
-                
-                if not template_id:
-                    logger.warning(f"Template missing template_id: {file_path}")
-                    return
-                
-                self.templates[template_id] = template_data
-                logger.debug(f"Loaded template: {template_id}")
-                
+            template_id = template_data.get("template_id")
         except Exception as e:
             logger.error(f"Error loading template from {file_path}: {e}")
+            return None
+        
+        if not template_id:
+            logger.warning(f"Template missing template_id: {file_path}")
+            return None
+        
+        return template_id, template_data
+    
+    def _store_template(self, template_id: str, template_data: Dict[str, Any]):
+        """
+        Store a loaded template.
+        
+        Args:
+            template_id: The ID of the template
+            template_data: The parsed template data
+        """
+        self.templates[template_id] = template_data
+        self._prompt_cache.clear()
+        logger.debug(f"Loaded template: {template_id}")
     
     def set_active_template(self, template_id: str):
         """
@@ -96,6 +142,27 @@ class PromptTemplateLoader:
             intent: The intent category to get a prompt for
             profile_id: Optional profile ID to get profile-specific instructions
             
+        Returns:
+            A prompt string for the intent, or empty string if not found
+        """
+        cache_key = (self.active_template_id, intent, profile_id)
+        prompt = self._prompt_cache.get(cache_key)
+        if prompt is not None:
+            return prompt
+        
+        prompt = self._build_intent_prompt(intent, profile_id)
+        if prompt:
+            self._prompt_cache[cache_key] = prompt
+        return prompt
+    
+    def _build_intent_prompt(self, intent: IntentCategory, profile_id: Optional[str] = None) -> str:
+        """
+        Build the prompt for an intent and optional profile from the active template.
+        
+        Args:
+            intent: The intent category to build a prompt for
+            profile_id: Optional profile ID to add profile-specific instructions
+            
         Returns:
             A prompt string for the intent, or empty string if not found
         """
@@ -109,16 +176,18 @@ class PromptTemplateLoader:
         intent_prompts = template.get("intent_prompts", {})
         
         # Get intent-specific prompt or default
-        intent_name = intent.value.upper()
+        intent_name = _INTENT_KEYS[intent]
         prompt = intent_prompts.get(intent_name)
         
         if prompt is None:
             prompt = intent_prompts.get("DEFAULT", "")
         
+        parts = [prompt]
+        
         # Add response instructions if available
         response_instructions = template.get("response_instructions")
         if response_instructions:
-            prompt = f"{prompt}\n\n{response_instructions}"
+            parts.append(response_instructions)
         
         # Add profile-specific instructions if available
         if profile_id:
@@ -126,6 +195,6 @@ class PromptTemplateLoader:
             profile_instructions = npc_specific.get(profile_id)
             
             if profile_instructions:
-                prompt = f"{prompt}\n\n{profile_instructions}"
+                parts.append(profile_instructions)
         
-        return prompt 
\ No newline at end of file
+        return "\n\n".join(parts) 
\ No newline at end of file
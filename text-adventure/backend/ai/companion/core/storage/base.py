@@ -5,7 +5,33 @@ This module defines the base interface for storage implementations.
 """
 
 import abc
-from typing import Dict, Any, List, Optional
+import time
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+# Most recently formatted timestamp and the time it was taken, in nanoseconds
+_last_timestamp_ns = 0
+_last_timestamp = ""
+
+
+def now_isoformat() -> str:
+    """
+    Get the current local time as an ISO 8601 string.
+    
+    The formatted string is reused for calls within the same millisecond,
+    so this is only suitable where sub-millisecond uniqueness isn't needed,
+    such as context timestamps.
+    
+    Returns:
+        The current time in ISO 8601 format
+    """
+    global _last_timestamp_ns, _last_timestamp
+    
+    now_ns = time.time_ns()
+    if not 0 <= now_ns - _last_timestamp_ns < 1_000_000:
+        _last_timestamp = datetime.fromtimestamp(now_ns / 1e9).isoformat()
+        _last_timestamp_ns = now_ns
+    return _last_timestamp
 
 
 class ConversationStorage(abc.ABC):
@@ -75,4 +101,61 @@ class ConversationStorage(abc.ABC):
         Returns:
             The number of contexts deleted
         """
-        pass 
\ No newline at end of file
+        pass
+    
+    async def close(self) -> None:
+        """
+        Release any resources held by the storage, such as open connections.
+        
+        The default implementation does nothing.
+        """
+        pass
+    
+    async def begin_turn(self, conversation_id: str) -> Tuple[Dict[str, Any], Any]:
+        """
+        Load a conversation context for a single request-response turn.
+        
+        The returned handle must be passed to commit_turn once the turn is
+        complete. A missing context is created in memory and only persisted
+        on commit.
+        
+        Args:
+            conversation_id: The ID of the conversation
+            
+        Returns:
+            A tuple of the conversation context and a handle for commit_turn
+        """
+        context = await self.get_context(conversation_id)
+        if not context:
+            context = {
+                "conversation_id": conversation_id,
+                "timestamp": now_isoformat(),
+                "entries": []
+            }
+        return context, (conversation_id, context)
+    
+    async def commit_turn(self, handle: Any, new_entries: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Append the entries of a turn to its context and save it.
+        
+        Entries added or cleared by other requests while the turn was being
+        generated must be kept; only the turn's own entries are appended. The
+        default implementation reads the context again and saves it, which
+        is neither a single write nor atomic, so backends should override it
+        with one that appends the new entries in a single write.
+        
+        Args:
+            handle: The handle returned by begin_turn
+            new_entries: The entries produced during the turn
+            
+        Returns:
+            The updated conversation context
+        """
+        conversation_id, snapshot = handle
+        context = await self.get_context(conversation_id)
+        if not context:
+            # The context was never saved or has been deleted since the turn began
+            context = {key: value for key, value in snapshot.items() if key != "entries"}
+        context.setdefault("entries", []).extend(new_entries)
+        await self.save_context(conversation_id, context)
+        return context
@@ -20,21 +20,12 @@ class StorageFactory:
     Factory for creating storage instances.
     
     This class is responsible for creating storage instances based on configuration.
+    Use the module-level default_storage_factory to share storage instances.
     """
     
-    _instance = None
-    _storage_instances = {}
-    
-    def __new__(cls):
-        """Create a singleton instance of the factory."""
-        if cls._instance is None:
-            cls._instance = super(StorageFactory, cls).__new__(cls)
-            cls._instance._initialize()
-        return cls._instance
-    
-    def _initialize(self):
+    def __init__(self):
         """Initialize the factory."""
-        self._storage_instances = {}
+        self._storage_instances: Dict[str, ConversationStorage] = {}
     
     def get_storage(self, config: Optional[Dict[str, Any]] = None) -> ConversationStorage:
         """
@@ -68,6 +59,14 @@ class StorageFactory:
         self._storage_instances[storage_type] = storage
         
         return storage
+    
+    async def close_all(self) -> None:
+        """Close all storage instances created by the factory."""
+        storage_instances = list(self._storage_instances.values())
+        self._storage_instances = {}
+        
+        for storage in storage_instances:
+            await storage.close()
 
 
 # Default storage factory instance
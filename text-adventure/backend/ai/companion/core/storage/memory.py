@@ -6,15 +6,127 @@ This module provides an in-memory implementation of the conversation storage.
 
 import logging
 import copy
+import sys
+import time
 import uuid
-from datetime import datetime, timedelta
-from typing import Dict, Any, List, Optional
+from bisect import bisect_left, insort
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
 
-from backend.ai.companion.core.storage.base import ConversationStorage
+from backend.ai.companion.core.storage.base import ConversationStorage, now_isoformat
 
 logger = logging.getLogger(__name__)
 
 
+class HistoryEntry:
+    """
+    A single conversation history entry in the compact form kept in memory.
+    
+    Entries with exactly these fields are stored as slotted objects instead of
+    dictionaries and converted back to the dictionary format on read.
+    """
+    
+    __slots__ = ("type", "text", "timestamp", "intent", "entities")
+    
+    def __init__(
+        self,
+        type: str,
+        text: str,
+        timestamp: str,
+        intent: Optional[str] = None,
+        entities: Optional[Dict[str, Any]] = None
+    ):
+        """
+        Initialize a history entry.
+        
+        Args:
+            type: The entry type, such as user_message
+            text: The message text
+            timestamp: The ISO timestamp of the entry
+            intent: The intent of the message, if any
+            entities: The entities extracted from the message, if any
+        """
+        self.type = type
+        self.text = text
+        self.timestamp = timestamp
+        self.intent = intent
+        self.entities = entities
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert the entry to the dictionary format used by storage."""
+        return {
+            "type": self.type,
+            "text": self.text,
+            "timestamp": self.timestamp,
+            "intent": self.intent,
+            "entities": self.entities
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'HistoryEntry':
+        """Create an entry from the dictionary format used by storage."""
+        return cls(
+            type=data.get("type", "unknown"),
+            text=data.get("text", data.get("content", "")),
+            timestamp=data.get("timestamp", ""),
+            intent=data.get("intent"),
+            entities=data.get("entities")
+        )
+
+# Fields that can be stored in the compact HistoryEntry form
+_HISTORY_ENTRY_FIELDS = frozenset(HistoryEntry.__slots__)
+
+# Value types that are immutable and can be returned without copying
+_SCALAR_TYPES = (str, int, float, bool, type(None))
+
+
+def _compact_entry(entry: Dict[str, Any]) -> Any:
+    """
+    Convert a history entry dict to a compact HistoryEntry when it has exactly
+    the HistoryEntry fields, so that expanding it gives back the same keys.
+    """
+    if isinstance(entry, dict) and entry.keys() == _HISTORY_ENTRY_FIELDS:
+        compact = HistoryEntry.from_dict(entry)
+        compact.entities = copy.deepcopy(compact.entities)
+        return compact
+    return copy.deepcopy(entry)
+
+
+def _copy_value(value: Any) -> Any:
+    """
+    Copy a stored value for a caller.
+    
+    Immutable scalars are shared with the stored copy; anything else is
+    deep-copied so callers cannot mutate what storage later returns.
+    """
+    if isinstance(value, _SCALAR_TYPES):
+        return value
+    return copy.deepcopy(value)
+
+
+def _expand_entry(entry: Any) -> Dict[str, Any]:
+    """Convert a stored entry back to the dictionary format callers expect."""
+    if isinstance(entry, HistoryEntry):
+        expanded = entry.to_dict()
+        expanded["entities"] = _copy_value(entry.entities)
+        return expanded
+    return {key: _copy_value(value) for key, value in entry.items()}
+
+
+def _timestamp_epoch(timestamp: Any) -> float:
+    """
+    Parse an ISO timestamp to a POSIX epoch for indexing.
+    
+    Missing or invalid timestamps sort as the oldest possible value.
+    """
+    if timestamp:
+        try:
+            return datetime.fromisoformat(timestamp).timestamp()
+        except (TypeError, ValueError):
+            pass
+    return float("-inf")
+
+
 class InMemoryConversationStorage(ConversationStorage):
     """
     In-memory implementation of the conversation storage.
@@ -23,18 +135,41 @@ class InMemoryConversationStorage(ConversationStorage):
     when the application restarts.
     """
     
-    # Class-level storage to simulate persistence across instances
-    _storage = {}
-    
     def __init__(self):
         """Initialize the in-memory storage."""
-        # Create a unique instance ID to isolate test instances
+        # Create a unique instance ID to identify this instance in logs
         self.instance_id = str(uuid.uuid4())[:8]
+        
+        # Stored contexts by conversation ID; each instance is isolated
+        self._storage: Dict[str, Dict[str, Any]] = {}
+        
+        # Index of the contexts as (epoch, conversation ID) pairs, kept sorted
+        # oldest first, plus each context's indexed epoch. Epochs are parsed
+        # once at save time so listing and cleanup compare floats.
+        self._sorted_by_ts: List[Tuple[float, str]] = []
+        self._timestamps: Dict[str, float] = {}
+        
         logger.debug(f"Initialized InMemoryConversationStorage with instance ID: {self.instance_id}")
     
-    def _get_prefixed_id(self, conversation_id: str) -> str:
-        """Get the prefixed conversation ID to ensure isolation between test instances."""
-        return f"{self.instance_id}:{conversation_id}"
+    def _index_context(self, conversation_id: str, timestamp: Any) -> None:
+        """Add or move a context in the timestamp index."""
+        self._unindex_context(conversation_id)
+        epoch = _timestamp_epoch(timestamp)
+        insort(self._sorted_by_ts, (epoch, conversation_id))
+        self._timestamps[conversation_id] = epoch
+    
+    def _unindex_context(self, conversation_id: str) -> None:
+        """Remove a context from the timestamp index if present."""
+        timestamp = self._timestamps.pop(conversation_id, None)
+        if timestamp is not None:
+            del self._sorted_by_ts[bisect_left(self._sorted_by_ts, (timestamp, conversation_id))]
+    
+    @staticmethod
+    def _expand_context(context: Dict[str, Any]) -> Dict[str, Any]:
+        """Make a caller-owned copy of a stored context with expanded entries."""
+        expanded = {key: _copy_value(value) for key, value in context.items() if key != 'entries'}
+        expanded['entries'] = [_expand_entry(entry) for entry in context.get('entries', ())]
+        return expanded
     
     async def get_context(self, conversation_id: str) -> Optional[Dict[str, Any]]:
         """
@@ -46,12 +181,12 @@ class InMemoryConversationStorage(ConversationStorage):
         Returns:
             The conversation context, or None if not found
         """
-        prefixed_id = self._get_prefixed_id(conversation_id)
-        context = InMemoryConversationStorage._storage.get(prefixed_id)
+        context = self._storage.get(conversation_id)
         if context:
-            logger.debug(f"Getting context for {conversation_id} with {len(context.get('entries', []))} entries")
-            # Make a deep copy to avoid mutations affecting our storage
-            return copy.deepcopy(context)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"Getting context for {conversation_id} with {len(context.get('entries', []))} entries")
+            # Make a copy to avoid mutations affecting our storage
+            return self._expand_context(context)
         logger.debug(f"No context found for {conversation_id}")
         return None
     
@@ -63,24 +198,55 @@ class InMemoryConversationStorage(ConversationStorage):
             conversation_id: The ID of the conversation
             context: The conversation context to save
         """
-        prefixed_id = self._get_prefixed_id(conversation_id)
-        
         # Ensure the context has a timestamp
         if 'timestamp' not in context:
-            context['timestamp'] = datetime.now().isoformat()
+            context['timestamp'] = now_isoformat()
         
         # Ensure entries exists
         if 'entries' not in context:
             context['entries'] = []
             
-        # Make a deep copy to avoid reference sharing
-        InMemoryConversationStorage._storage[prefixed_id] = copy.deepcopy(context)
+        # Copy on write so later changes by the caller do not reach storage;
+        # entries are stored as an immutable tuple in compact form, and reads
+        # only deep-copy values that are not scalars
+        stored = copy.deepcopy({k: v for k, v in context.items() if k != 'entries'})
+        stored['entries'] = tuple(_compact_entry(entry) for entry in context['entries'])
+        self._storage[conversation_id] = stored
+        self._index_context(conversation_id, stored.get('timestamp'))
+        
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Saved context for {conversation_id} with {len(stored['entries'])} entries")
+    
+    async def commit_turn(self, handle: Any, new_entries: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Append the entries of a turn to its stored context.
         
-        logger.debug(f"Saved context for {conversation_id} with {len(context.get('entries', []))} entries")
+        The stored context is read and replaced without yielding to the event
+        loop, so turns committed concurrently never overwrite each other.
         
-        # Verify the entries were saved correctly
-        saved_context = InMemoryConversationStorage._storage[prefixed_id]
-        logger.debug(f"Verified saved context has {len(saved_context.get('entries', []))} entries")
+        Args:
+            handle: The handle returned by begin_turn
+            new_entries: The entries produced during the turn
+            
+        Returns:
+            The updated conversation context
+        """
+        conversation_id, snapshot = handle
+        stored = self._storage.get(conversation_id)
+        if stored is None:
+            # The context was never saved or has been deleted since the turn began
+            stored = copy.deepcopy({k: v for k, v in snapshot.items() if k != 'entries'})
+            stored.setdefault('timestamp', now_isoformat())
+            stored['entries'] = ()
+            self._index_context(conversation_id, stored['timestamp'])
+        else:
+            stored = dict(stored)
+        stored['entries'] += tuple(_compact_entry(entry) for entry in new_entries)
+        self._storage[conversation_id] = stored
+        
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Committed {len(new_entries)} turn entries for {conversation_id}")
+        return self._expand_context(stored)
     
     async def delete_context(self, conversation_id: str) -> None:
         """
@@ -89,10 +255,10 @@ class InMemoryConversationStorage(ConversationStorage):
         Args:
             conversation_id: The ID of the conversation
         """
-        prefixed_id = self._get_prefixed_id(conversation_id)
-        if prefixed_id in InMemoryConversationStorage._storage:
+        if conversation_id in self._storage:
             logger.debug(f"Deleting context for {conversation_id}")
-            del InMemoryConversationStorage._storage[prefixed_id]
+            del self._storage[conversation_id]
+        self._unindex_context(conversation_id)
     
     async def list_contexts(self, limit: int = 100, offset: int = 0) -> List[Dict[str, Any]]:
         """
@@ -105,19 +271,17 @@ class InMemoryConversationStorage(ConversationStorage):
         Returns:
             A list of conversation contexts
         """
-        # Filter contexts that belong to this instance
-        prefix = f"{self.instance_id}:"
-        instance_contexts = {
-            k.replace(prefix, ''): v 
-            for k, v in InMemoryConversationStorage._storage.items() 
-            if k.startswith(prefix)
-        }
-        
-        # Convert to list, copy, sort by timestamp (newest first), and slice
-        contexts = [copy.deepcopy(ctx) for ctx in instance_contexts.values()]
-        contexts.sort(key=lambda ctx: ctx.get('timestamp', ''), reverse=True)
-        logger.debug(f"Listing contexts: found {len(contexts)} total, returning {min(limit, max(0, len(contexts) - offset))} contexts")
-        return contexts[offset:offset + limit] if offset < len(contexts) else []
+        # Walk the index newest first, touching only the requested page
+        total = len(self._sorted_by_ts)
+        stop = max(0, total - offset)
+        start = max(0, stop - limit)
+        contexts = [
+            self._expand_context(self._storage[conversation_id])
+            for _, conversation_id in reversed(self._sorted_by_ts[start:stop])
+        ]
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Listing contexts: found {total} total, returning {len(contexts)} contexts")
+        return contexts
     
     async def cleanup_old_contexts(self, max_age_days: int = 30) -> int:
         """
@@ -129,26 +293,19 @@ class InMemoryConversationStorage(ConversationStorage):
         Returns:
             The number of contexts deleted
         """
-        now = datetime.now()
-        max_age = timedelta(days=max_age_days)
-        count = 0
-        
-        # Filter contexts that belong to this instance
-        prefix = f"{self.instance_id}:"
-        for key, context in list(InMemoryConversationStorage._storage.items()):
-            if not key.startswith(prefix):
-                continue
-                
-            timestamp = context.get('timestamp')
-            if timestamp:
-                try:
-                    context_date = datetime.fromisoformat(timestamp)
-                    if now - context_date > max_age:
-                        del InMemoryConversationStorage._storage[key]
-                        count += 1
-                except ValueError:
-                    # Invalid timestamp format, ignore this entry
-                    pass
+        cutoff = time.time() - max_age_days * 86400
+        
+        # Expired contexts form one contiguous run of the sorted index, after
+        # any contexts with missing or invalid timestamps, which are ignored
+        start = bisect_left(self._sorted_by_ts, (-sys.float_info.max,))
+        stop = bisect_left(self._sorted_by_ts, (cutoff,))
+        expired = self._sorted_by_ts[start:stop]
+        del self._sorted_by_ts[start:stop]
+        
+        for _, key in expired:
+            del self._storage[key]
+            del self._timestamps[key]
+        count = len(expired)
         
         logger.debug(f"Cleaned up {count} old contexts")
         return count
@@ -161,22 +318,20 @@ class InMemoryConversationStorage(ConversationStorage):
             conversation_id: The ID of the conversation to clear entries for
         """
         logger.debug(f"Clearing entries for {conversation_id}")
-        prefixed_id = self._get_prefixed_id(conversation_id)
-        
-        if prefixed_id in InMemoryConversationStorage._storage:
-            # Get a copy of the existing context
-            context = copy.deepcopy(InMemoryConversationStorage._storage[prefixed_id])
-            # Clear entries
-            context["entries"] = []
-            # Save it back
-            InMemoryConversationStorage._storage[prefixed_id] = context
+        
+        if conversation_id in self._storage:
+            # Replace the stored context with one that has no entries
+            context = dict(self._storage[conversation_id])
+            context["entries"] = ()
+            self._storage[conversation_id] = context
             logger.debug(f"Cleared all entries for {conversation_id}")
         else:
             # Create a new empty context
             context = {
                 "conversation_id": conversation_id,
-                "timestamp": datetime.now().isoformat(),
-                "entries": []
+                "timestamp": now_isoformat(),
+                "entries": ()
             }
-            InMemoryConversationStorage._storage[prefixed_id] = context
+            self._storage[conversation_id] = context
+            self._index_context(conversation_id, context["timestamp"])
             logger.debug(f"Created new empty context for {conversation_id}") 
\ No newline at end of file
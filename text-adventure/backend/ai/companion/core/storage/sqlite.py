@@ -5,16 +5,135 @@ This module provides a SQLite implementation of the conversation storage.
 """
 
 import os
-import json
+import asyncio
 import logging
+import sqlite3
 import aiosqlite
+from contextlib import asynccontextmanager
+from itertools import chain, groupby
+from operator import itemgetter
 from datetime import datetime, timedelta
-from typing import Dict, Any, List, Optional, Tuple
+from typing import Dict, Any, List, Optional, Tuple, AsyncIterator
 
-from backend.ai.companion.core.storage.base import ConversationStorage
+from backend.ai.companion.core.storage.base import ConversationStorage, now_isoformat
+from backend.ai.companion.utils import json_codec
 
 logger = logging.getLogger(__name__)
 
+# Default number of pooled connections per storage instance
+DEFAULT_POOL_SIZE = 4
+
+# Context and entry fields stored in their own columns rather than in the
+# metadata blob
+_CONTEXT_CORE_FIELDS = frozenset({'conversation_id', 'timestamp'})
+_ENTRY_CORE_FIELDS = frozenset({'type', 'timestamp', 'text', 'content'})
+
+# Unique key used to de-duplicate entries when a context is saved again
+_CREATE_ENTRY_KEY_INDEX = """
+    CREATE UNIQUE INDEX IF NOT EXISTS ux_entries
+    ON entries (conversation_id, timestamp, type, content)
+"""
+
+# Statements run on every context save or turn commit
+_SQL_UPSERT_CONVERSATION = """
+    INSERT OR REPLACE INTO conversations (conversation_id, timestamp, metadata)
+    VALUES (?, ?, ?)
+"""
+_SQL_INSERT_CONVERSATION = """
+    INSERT OR IGNORE INTO conversations (conversation_id, timestamp, metadata)
+    VALUES (?, ?, ?)
+"""
+_SQL_INSERT_ENTRY = """
+    INSERT OR IGNORE INTO entries (conversation_id, timestamp, type, content, metadata)
+    VALUES (?, ?, ?, ?, ?)
+"""
+
+# Per-connection settings; unlike journal_mode these do not persist in the
+# database file and must be applied each time a connection is opened
+_CONNECTION_PRAGMAS = """
+    PRAGMA synchronous=NORMAL;
+    PRAGMA temp_store=MEMORY;
+    PRAGMA cache_size=-64000;
+    PRAGMA busy_timeout=5000;
+    PRAGMA mmap_size=268435456;
+"""
+
+
+def _load_metadata(value: Optional[str]) -> Dict[str, Any]:
+    """Parse a metadata column, treating missing or invalid JSON as empty."""
+    if not value:
+        return {}
+    try:
+        return json_codec.loads(value)
+    except json_codec.JSONDecodeError:
+        return {}
+
+
+def _entry_from_row(timestamp: str, entry_type: str, content: str, metadata: Optional[str]) -> Dict[str, Any]:
+    """
+    Build an entry dictionary from the columns of an entries row.
+    
+    Args:
+        timestamp: The entry timestamp
+        entry_type: The entry type
+        content: The entry content
+        metadata: The JSON metadata blob
+        
+    Returns:
+        The entry dictionary
+    """
+    # Create the entry dictionary with common fields
+    entry_dict = {
+        "timestamp": timestamp,
+        "type": entry_type,
+        **_load_metadata(metadata)
+    }
+    
+    # Handle different entry types
+    if entry_type == 'user_message' or entry_type == 'assistant_message':
+        entry_dict['text'] = content
+    else:
+        # For other types, store the content as is
+        entry_dict['content'] = content
+    
+    return entry_dict
+
+
+def _entry_row(conversation_id: str, entry: Dict[str, Any]) -> Tuple[Any, ...]:
+    """
+    Build the column values of an entries row from an entry dictionary.
+    
+    Args:
+        conversation_id: The ID of the conversation the entry belongs to
+        entry: The entry dictionary
+        
+    Returns:
+        The values for the _SQL_INSERT_ENTRY statement
+    """
+    entry_type = entry.get('type', 'unknown')
+    timestamp = entry.get('timestamp')
+    if timestamp is None:
+        # Only entries without a timestamp need the clock; each gets its own
+        # reading since it is part of the entry key
+        timestamp = datetime.now().isoformat()
+    
+    # Handle different entry types
+    if entry_type in ('user_message', 'assistant_message'):
+        content = entry.get('text', '')
+    else:
+        content = entry.get('content', '')
+    
+    # Separate metadata from core fields
+    metadata = {k: v for k, v in entry.items() if k not in _ENTRY_CORE_FIELDS}
+    
+    return (
+        conversation_id,
+        timestamp,
+        entry_type,
+        content,
+        json_codec.dumps(metadata) if metadata else None
+    )
+
 
 class SQLiteConversationStorage(ConversationStorage):
     """
@@ -24,12 +143,13 @@ class SQLiteConversationStorage(ConversationStorage):
     them across application restarts.
     """
     
-    def __init__(self, database_path: str = None):
+    def __init__(self, database_path: str = None, pool_size: int = DEFAULT_POOL_SIZE):
         """
         Initialize the SQLite storage.
         
         Args:
             database_path: Path to the SQLite database file. If None, uses a default path.
+            pool_size: Number of long-lived connections to keep open
         """
         self.database_path = database_path or os.path.join(
             os.path.dirname(os.path.abspath(__file__)),
@@ -40,40 +160,160 @@ class SQLiteConversationStorage(ConversationStorage):
         # Ensure the directory exists
         os.makedirs(os.path.dirname(self.database_path), exist_ok=True)
         
+        # The schema only needs to be created once per storage instance
+        self._initialized = False
+        self._init_lock = asyncio.Lock()
+        
+        # Connections are opened lazily on first use and reused across calls
+        self.pool_size = max(1, pool_size)
+        self._connections: List[aiosqlite.Connection] = []
+        self._pool: Optional[asyncio.Queue] = None
+        self._pool_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pool_lock = asyncio.Lock()
+        
         logger.debug(f"Initialized SQLiteConversationStorage with database at {self.database_path}")
     
     async def _init_db(self) -> None:
         """Initialize the database schema if it doesn't exist."""
-        async with aiosqlite.connect(self.database_path) as db:
-            # Create the conversations table
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS conversations (
-                    conversation_id TEXT PRIMARY KEY,
-                    timestamp TEXT NOT NULL,
-                    metadata TEXT
-                )
-            """)
+        if self._initialized:
+            return
+        
+        async with self._init_lock:
+            if self._initialized:
+                return
             
-            # Create the entries table
+            # Create the schema on the first long-lived connection instead of
+            # a throwaway one, then keep it for the pool
+            db = await self._connect()
+            try:
+                await self._create_schema(db)
+            except BaseException:
+                await db.close()
+                raise
+            self._connections.append(db)
+            self._initialized = True
+    
+    async def _create_schema(self, db: aiosqlite.Connection) -> None:
+        """
+        Create the database tables and indices.
+        
+        Args:
+            db: The connection to create the schema with
+        """
+        # Use write-ahead logging; this setting persists in the database file
+        await db.execute("PRAGMA journal_mode=WAL")
+        
+        # Create the conversations table
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS conversations (
+                conversation_id TEXT PRIMARY KEY,
+                timestamp TEXT NOT NULL,
+                metadata TEXT
+            )
+        """)
+        
+        # Create the entries table
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                conversation_id TEXT NOT NULL,
+                timestamp TEXT NOT NULL,
+                type TEXT NOT NULL,
+                content TEXT NOT NULL,
+                metadata TEXT,
+                FOREIGN KEY (conversation_id) REFERENCES conversations (conversation_id)
+                    ON DELETE CASCADE
+            )
+        """)
+        
+        # Create indices for faster queries
+        await db.execute("CREATE INDEX IF NOT EXISTS idx_conversation_timestamp ON conversations (timestamp)")
+        await db.execute("CREATE INDEX IF NOT EXISTS idx_entries_timestamp ON entries (timestamp)")
+        
+        # Let the engine drop duplicate entries on insert
+        try:
+            await db.execute(_CREATE_ENTRY_KEY_INDEX)
+        except sqlite3.IntegrityError:
+            # Databases written before the index existed may hold duplicates;
+            # keep the first copy of each entry and retry
+            logger.warning(f"Removing duplicate entries from {self.database_path}")
             await db.execute("""
-                CREATE TABLE IF NOT EXISTS entries (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    conversation_id TEXT NOT NULL,
-                    timestamp TEXT NOT NULL,
-                    type TEXT NOT NULL,
-                    content TEXT NOT NULL,
-                    metadata TEXT,
-                    FOREIGN KEY (conversation_id) REFERENCES conversations (conversation_id)
-                        ON DELETE CASCADE
+                DELETE FROM entries WHERE id NOT IN (
+                    SELECT MIN(id) FROM entries
+                    GROUP BY conversation_id, timestamp, type, content
                 )
             """)
+            await db.execute(_CREATE_ENTRY_KEY_INDEX)
+        
+        # The entry key index starts with (conversation_id, timestamp), so it
+        # serves lookups by conversation and a separate index only slows writes
+        await db.execute("DROP INDEX IF EXISTS idx_entries_conversation_id")
+        
+        await db.commit()
+    
+    async def _connect(self) -> aiosqlite.Connection:
+        """Open a connection to the database with the per-connection settings applied."""
+        db = await aiosqlite.connect(self.database_path)
+        db.row_factory = aiosqlite.Row
+        await db.executescript(_CONNECTION_PRAGMAS)
+        return db
+    
+    async def _get_pool(self) -> asyncio.Queue:
+        """Get the connection pool, opening the connections on first use."""
+        loop = asyncio.get_running_loop()
+        if self._pool is not None and self._pool_loop is loop:
+            return self._pool
+        
+        async with self._pool_lock:
+            if self._pool is not None and self._pool_loop is loop:
+                return self._pool
             
-            # Create indices for faster queries
-            await db.execute("CREATE INDEX IF NOT EXISTS idx_conversation_timestamp ON conversations (timestamp)")
-            await db.execute("CREATE INDEX IF NOT EXISTS idx_entries_conversation_id ON entries (conversation_id)")
-            await db.execute("CREATE INDEX IF NOT EXISTS idx_entries_timestamp ON entries (timestamp)")
+            await self._init_db()
             
-            await db.commit()
+            while len(self._connections) < self.pool_size:
+                self._connections.append(await self._connect())
+            
+            # Queues are bound to an event loop, so rebuild it if the loop changed
+            pool = asyncio.Queue()
+            for db in self._connections:
+                pool.put_nowait(db)
+            self._pool = pool
+            self._pool_loop = loop
+            
+            logger.debug(f"Opened {len(self._connections)} pooled connections to {self.database_path}")
+            return pool
+    
+    @asynccontextmanager
+    async def _acquire(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Borrow a connection from the pool for the duration of the block."""
+        pool = await self._get_pool()
+        db = await pool.get()
+        try:
+            yield db
+        except BaseException:
+            # Never hand a connection with a dangling transaction to the next caller
+            if db.in_transaction:
+                await db.rollback()
+            raise
+        finally:
+            pool.put_nowait(db)
+    
+    async def close(self) -> None:
+        """Close all pooled connections."""
+        connections, self._connections = self._connections, []
+        self._pool = None
+        self._pool_loop = None
+        
+        for db in connections:
+            # Let SQLite refresh the query planner statistics before closing
+            try:
+                await db.execute("PRAGMA optimize")
+            except sqlite3.Error as e:
+                logger.warning(f"Failed to optimize {self.database_path}: {e}")
+            await db.close()
+        
+        if connections:
+            logger.debug(f"Closed {len(connections)} pooled connections to {self.database_path}")
     
     async def get_context(self, conversation_id: str) -> Optional[Dict[str, Any]]:
         """
@@ -87,9 +327,7 @@ class SQLiteConversationStorage(ConversationStorage):
         """
         await self._init_db()
         
-        async with aiosqlite.connect(self.database_path) as db:
-            db.row_factory = aiosqlite.Row
-            
+        async with self._acquire() as db:
             # Get the conversation
             async with db.execute(
                 "SELECT * FROM conversations WHERE conversation_id = ?",
@@ -100,53 +338,25 @@ class SQLiteConversationStorage(ConversationStorage):
                 if not row:
                     return None
                 
-                # Parse the conversation metadata
-                try:
-                    metadata = json.loads(row['metadata']) if row['metadata'] else {}
-                except json.JSONDecodeError:
-                    metadata = {}
-                
                 # Initialize the context with empty entries
                 context = {
                     "conversation_id": row['conversation_id'],
                     "timestamp": row['timestamp'],
                     "entries": [],
-                    **metadata
+                    **_load_metadata(row['metadata'])
                 }
                 
                 # Get the conversation entries
                 async with db.execute(
                     """
-                    SELECT * FROM entries 
+                    SELECT timestamp, type, content, metadata FROM entries 
                     WHERE conversation_id = ? 
                     ORDER BY timestamp ASC
                     """,
                     (conversation_id,)
                 ) as entries_cursor:
                     entries = await entries_cursor.fetchall()
-                    
-                    for entry in entries:
-                        try:
-                            metadata = json.loads(entry['metadata']) if entry['metadata'] else {}
-                        except json.JSONDecodeError:
-                            metadata = {}
-                        
-                        # Create the entry dictionary with common fields
-                        entry_dict = {
-                            "timestamp": entry['timestamp'],
-                            "type": entry['type'],
-                            **metadata
-                        }
-                        
-                        # Handle different entry types
-                        if entry['type'] == 'user_message' or entry['type'] == 'assistant_message':
-                            entry_dict['text'] = entry['content']
-                        else:
-                            # For other types, store the content as is
-                            entry_dict['content'] = entry['content']
-                        
-                        # Add the entry to the context
-                        context['entries'].append(entry_dict)
+                    context['entries'] = [_entry_from_row(*entry) for entry in entries]
                 
                 return context
     
@@ -162,7 +372,7 @@ class SQLiteConversationStorage(ConversationStorage):
         
         # Ensure the context has a timestamp
         if 'timestamp' not in context:
-            context['timestamp'] = datetime.now().isoformat()
+            context['timestamp'] = now_isoformat()
         
         # Make a copy of the context to avoid modifying the original
         context_copy = context.copy()
@@ -171,88 +381,106 @@ class SQLiteConversationStorage(ConversationStorage):
         entries = context_copy.pop('entries', [])
         
         # Separate metadata from core fields
-        metadata = {k: v for k, v in context_copy.items() if k not in ('conversation_id', 'timestamp')}
+        metadata = {k: v for k, v in context_copy.items() if k not in _CONTEXT_CORE_FIELDS}
         
         logger.debug(f"Saving context for {conversation_id} with {len(entries)} entries")
         
         # Start transaction
-        async with aiosqlite.connect(self.database_path) as db:
+        async with self._acquire() as db, db.cursor() as cursor:
             try:
+                # Run every statement of the save through one cursor
                 # Start an explicit transaction
-                await db.execute("BEGIN EXCLUSIVE TRANSACTION")
+                await cursor.execute("BEGIN EXCLUSIVE TRANSACTION")
                 
                 # Insert or update the conversation
-                await db.execute(
-                    """
-                    INSERT OR REPLACE INTO conversations (conversation_id, timestamp, metadata)
-                    VALUES (?, ?, ?)
-                    """,
+                await cursor.execute(
+                    _SQL_UPSERT_CONVERSATION,
                     (
                         conversation_id,
                         context_copy.get('timestamp'),
-                        json.dumps(metadata) if metadata else None
+                        json_codec.dumps(metadata) if metadata else None
                     )
                 )
                 
-                # Only insert new entries, don't delete existing ones
-                for entry in entries:
-                    entry_type = entry.get('type', 'unknown')
-                    timestamp = entry.get('timestamp', datetime.now().isoformat())
-                    
-                    # Handle different entry types
-                    if entry_type in ('user_message', 'assistant_message'):
-                        content = entry.get('text', '')
-                    else:
-                        content = entry.get('content', '')
-                    
-                    # Separate metadata from core fields
-                    metadata = {k: v for k, v in entry.items() 
-                               if k not in ('type', 'timestamp', 'text', 'content')}
-                    
-                    # Check if this entry already exists to avoid duplicates
-                    async with db.execute(
-                        """
-                        SELECT id FROM entries 
-                        WHERE conversation_id = ? AND timestamp = ? AND type = ? AND content = ?
-                        """,
-                        (conversation_id, timestamp, entry_type, content)
-                    ) as cursor:
-                        existing = await cursor.fetchone()
-                    
-                    # Only insert if the entry doesn't exist
-                    if not existing:
-                        logger.debug(f"Adding new entry for {conversation_id} of type {entry_type}")
-                        await db.execute(
-                            """
-                            INSERT INTO entries (conversation_id, timestamp, type, content, metadata)
-                            VALUES (?, ?, ?, ?, ?)
-                            """,
-                            (
-                                conversation_id,
-                                timestamp,
-                                entry_type,
-                                content,
-                                json.dumps(metadata) if metadata else None
-                            )
-                        )
+                # Only insert new entries, don't delete existing ones; entries
+                # already stored are skipped by the unique entry key index
+                rows = [_entry_row(conversation_id, entry) for entry in entries]
+                
+                # Insert all entries with a single statement
+                if rows:
+                    await cursor.executemany(_SQL_INSERT_ENTRY, rows)
                 
                 # Commit the transaction to save all changes
                 await db.commit()
-                logger.debug(f"Successfully saved context for {conversation_id}")
+                
+                if logger.isEnabledFor(logging.DEBUG):
+                    await cursor.execute(
+                        "SELECT COUNT(*) FROM entries WHERE conversation_id = ?",
+                        (conversation_id,)
+                    )
+                    (saved_entries_count,) = await cursor.fetchone()
+                    logger.debug(f"Saved context for {conversation_id} with {saved_entries_count} entries")
                 
             except Exception as e:
                 # If any error occurs, roll back the transaction
                 await db.execute("ROLLBACK")
                 logger.error(f"Error saving context for {conversation_id}: {e}")
                 raise
+    
+    async def commit_turn(self, handle: Any, new_entries: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Append the entries of a turn to its conversation in one transaction.
+        
+        Only the new entries are inserted, so entries added or cleared by
+        other requests while the turn was being generated are kept. The
+        conversation row is created if it does not exist and left as is
+        otherwise.
+        
+        Args:
+            handle: The handle returned by begin_turn
+            new_entries: The entries produced during the turn
+            
+        Returns:
+            The updated conversation context
+        """
+        await self._init_db()
+        
+        conversation_id, snapshot = handle
+        context = {k: v for k, v in snapshot.items() if k != 'entries'}
+        metadata = {k: v for k, v in context.items() if k not in _CONTEXT_CORE_FIELDS}
+        rows = [_entry_row(conversation_id, entry) for entry in new_entries]
         
-        # Verify the entries were saved correctly by retrieving them
-        saved_context = await self.get_context(conversation_id)
-        if saved_context:
-            saved_entries_count = len(saved_context.get('entries', []))
-            logger.debug(f"Verified saved context for {conversation_id} has {saved_entries_count} entries")
-        else:
-            logger.warning(f"Failed to verify saved context for {conversation_id}")
+        async with self._acquire() as db, db.cursor() as cursor:
+            # Take the write lock up front so concurrent turns queue up here
+            # instead of failing to upgrade a read lock
+            await cursor.execute("BEGIN IMMEDIATE")
+            await cursor.execute(
+                _SQL_INSERT_CONVERSATION,
+                (
+                    conversation_id,
+                    context.get('timestamp') or now_isoformat(),
+                    json_codec.dumps(metadata) if metadata else None
+                )
+            )
+            if rows:
+                await cursor.executemany(_SQL_INSERT_ENTRY, rows)
+            
+            # Read the entries back before releasing the lock so the result
+            # includes entries committed by other turns
+            await cursor.execute(
+                """
+                SELECT timestamp, type, content, metadata FROM entries 
+                WHERE conversation_id = ? 
+                ORDER BY timestamp ASC
+                """,
+                (conversation_id,)
+            )
+            context['entries'] = [_entry_from_row(*row) for row in await cursor.fetchall()]
+            await db.commit()
+        
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Committed {len(rows)} turn entries for {conversation_id}")
+        return context
     
     async def delete_context(self, conversation_id: str) -> None:
         """
@@ -263,7 +491,9 @@ class SQLiteConversationStorage(ConversationStorage):
         """
         await self._init_db()
         
-        async with aiosqlite.connect(self.database_path) as db:
+        async with self._acquire() as db:
+            await db.execute("BEGIN IMMEDIATE")
+            
             # Delete the conversation (cascades to entries)
             await db.execute(
                 "DELETE FROM conversations WHERE conversation_id = ?",
@@ -285,27 +515,40 @@ class SQLiteConversationStorage(ConversationStorage):
         """
         await self._init_db()
         
-        contexts = []
-        
-        async with aiosqlite.connect(self.database_path) as db:
-            db.row_factory = aiosqlite.Row
-            
-            # Get conversations
+        async with self._acquire() as db:
+            # Fetch the page of conversations and all of their entries in one
+            # query; conversations without entries yield a single row of NULLs
             async with db.execute(
                 """
-                SELECT * FROM conversations
-                ORDER BY timestamp DESC
-                LIMIT ? OFFSET ?
+                SELECT c.conversation_id, c.timestamp, c.metadata,
+                       e.timestamp, e.type, e.content, e.metadata
+                FROM (
+                    SELECT * FROM conversations
+                    ORDER BY timestamp DESC, conversation_id
+                    LIMIT ? OFFSET ?
+                ) AS c
+                LEFT JOIN entries AS e ON e.conversation_id = c.conversation_id
+                ORDER BY c.timestamp DESC, c.conversation_id, e.timestamp ASC, e.id ASC
                 """,
                 (limit, offset)
             ) as cursor:
                 rows = await cursor.fetchall()
-                
-                for row in rows:
-                    conversation_id = row['conversation_id']
-                    context = await self.get_context(conversation_id)
-                    if context:
-                        contexts.append(context)
+        
+        # Group the joined rows back into one context per conversation
+        contexts = []
+        for conversation_id, group in groupby(rows, key=itemgetter(0)):
+            first = next(group)
+            context = {
+                "conversation_id": conversation_id,
+                "timestamp": first[1],
+                "entries": [],
+                **_load_metadata(first[2])
+            }
+            if first[4] is not None:
+                context['entries'] = [
+                    _entry_from_row(*row[3:]) for row in chain((first,), group)
+                ]
+            contexts.append(context)
         
         return contexts
     
@@ -323,20 +566,17 @@ class SQLiteConversationStorage(ConversationStorage):
         
         cutoff_date = (datetime.now() - timedelta(days=max_age_days)).isoformat()
         
-        async with aiosqlite.connect(self.database_path) as db:
-            # Get the count of conversations to be deleted
-            async with db.execute(
-                "SELECT COUNT(*) FROM conversations WHERE timestamp < ?",
-                (cutoff_date,)
-            ) as cursor:
-                row = await cursor.fetchone()
-                count = row[0] if row else 0
+        async with self._acquire() as db:
+            # Take the write lock up front so the delete never has to upgrade it
+            await db.execute("BEGIN IMMEDIATE")
             
-            # Delete the conversations (cascades to entries)
-            await db.execute(
+            # Delete the conversations (cascades to entries); the row count of
+            # the delete is the number of conversations removed
+            async with db.execute(
                 "DELETE FROM conversations WHERE timestamp < ?",
                 (cutoff_date,)
-            )
+            ) as cursor:
+                count = cursor.rowcount
             
             await db.commit()
         
@@ -353,7 +593,7 @@ class SQLiteConversationStorage(ConversationStorage):
         
         logger.debug(f"Clearing entries for conversation {conversation_id}")
         
-        async with aiosqlite.connect(self.database_path) as db:
+        async with self._acquire() as db:
             try:
                 # Start an explicit transaction
                 await db.execute("BEGIN EXCLUSIVE TRANSACTION")
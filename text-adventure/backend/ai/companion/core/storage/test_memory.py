@@ -0,0 +1,102 @@
+"""
+Text Adventure - Tests for InMemoryConversationStorage
+
+This module tests that contexts returned by the in-memory storage are owned by
+the caller, so changing them never changes what the storage holds.
+"""
+
+import pytest
+
+from backend.ai.companion.core.storage.memory import InMemoryConversationStorage
+
+
+@pytest.fixture
+def sample_context():
+    """Sample conversation context with nested metadata and entry values."""
+    return {
+        "conversation_id": "conv-1",
+        "timestamp": "2023-05-01T12:00:00",
+        "meta": {"x": 1},
+        "entries": [
+            {
+                "type": "user_message",
+                "text": "What does 'kippu' mean?",
+                "timestamp": "2023-05-01T12:00:00",
+                "intent": "vocabulary_help",
+                "entities": {"word": "kippu"}
+            },
+            {
+                "type": "assistant_message",
+                "text": "'Kippu' means 'ticket'.",
+                "timestamp": "2023-05-01T12:00:30",
+                "extra": {"n": 1}
+            }
+        ]
+    }
+
+
+class TestInMemoryConversationStorage:
+    """Tests for the InMemoryConversationStorage class."""
+    
+    @pytest.mark.asyncio
+    async def test_get_context_returns_isolated_copy(self, sample_context):
+        """Test that mutating a context from get_context leaves storage unchanged."""
+        storage = InMemoryConversationStorage()
+        await storage.save_context("conv-1", sample_context)
+        
+        context = await storage.get_context("conv-1")
+        context["meta"]["x"] = 2
+        context["entries"][0]["entities"]["word"] = "changed"
+        context["entries"][1]["extra"]["n"] = 2
+        context["entries"].append({"type": "user_message", "text": "extra"})
+        
+        stored = await storage.get_context("conv-1")
+        assert stored["meta"] == {"x": 1}
+        assert stored["entries"][0]["entities"] == {"word": "kippu"}
+        assert stored["entries"][1]["extra"] == {"n": 1}
+        assert len(stored["entries"]) == 2
+    
+    @pytest.mark.asyncio
+    async def test_list_contexts_returns_isolated_copies(self, sample_context):
+        """Test that mutating a context from list_contexts leaves storage unchanged."""
+        storage = InMemoryConversationStorage()
+        await storage.save_context("conv-1", sample_context)
+        
+        [context] = await storage.list_contexts()
+        context["meta"]["x"] = 2
+        context["entries"][1]["extra"]["n"] = 2
+        
+        stored = await storage.get_context("conv-1")
+        assert stored["meta"] == {"x": 1}
+        assert stored["entries"][1]["extra"] == {"n": 1}
+    
+    @pytest.mark.asyncio
+    async def test_save_context_copies_the_input(self, sample_context):
+        """Test that mutating a context after saving it leaves storage unchanged."""
+        storage = InMemoryConversationStorage()
+        await storage.save_context("conv-1", sample_context)
+        
+        sample_context["meta"]["x"] = 2
+        sample_context["entries"][0]["entities"]["word"] = "changed"
+        
+        stored = await storage.get_context("conv-1")
+        assert stored["meta"] == {"x": 1}
+        assert stored["entries"][0]["entities"] == {"word": "kippu"}
+    
+    @pytest.mark.asyncio
+    async def test_commit_turn_keeps_concurrent_changes(self):
+        """Test that committing a turn appends only its entries to the stored context."""
+        storage = InMemoryConversationStorage()
+        _, first = await storage.begin_turn("conv-1")
+        _, second = await storage.begin_turn("conv-1")
+        
+        await storage.commit_turn(first, [{"type": "user_message", "text": "a"}])
+        context = await storage.commit_turn(second, [{"type": "user_message", "text": "b"}])
+        assert [entry["text"] for entry in context["entries"]] == ["a", "b"]
+        
+        _, third = await storage.begin_turn("conv-1")
+        await storage.clear_entries("conv-1")
+        context = await storage.commit_turn(third, [{"type": "user_message", "text": "c"}])
+        assert [entry["text"] for entry in context["entries"]] == ["c"]
+        stored = await storage.get_context("conv-1")
+        assert [entry["text"] for entry in stored["entries"]] == ["c"]
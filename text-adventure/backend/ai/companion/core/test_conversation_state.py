@@ -0,0 +1,165 @@
+"""
+Text Adventure - Tests for conversation state detection
+
+This module tests ConversationManager.detect_conversation_state, which matches
+the player's input against compiled alternations of the clarification and
+follow-up patterns and skips them for inputs that are too short to match.
+"""
+
+import re
+
+import pytest
+
+from backend.ai.companion.core.models import ClassifiedRequest
+from backend.ai.companion.core.conversation_manager import ConversationManager, ConversationState
+from backend.ai.companion.core.storage.memory import InMemoryConversationStorage
+
+
+# Inputs covering each pattern list, entity references, and short inputs
+PLAYER_INPUTS = [
+    "kippu",
+    "What time does the train to Tokyo leave?",
+    "Kippu?",
+    "I don't understand",
+    "Sorry, what do you mean?",
+    "Could you clarify the second part?",
+    "Can you repeat that please",
+    "what was that again",
+    "That doesn't make sense to me",
+    "What does kudasai mean in that sentence?",
+    "How do you say ticket in that phrase?",
+    "What about the JR pass?",
+    "how about a taxi",
+    "Tell me more about Odawara",
+    "What is the difference between kippu and ken?",
+    "Could you elaborate on the platforms?",
+    "what about",
+    "Where is the station?",
+    "駅",
+    "JR",
+    "jr",
+    "ok",
+    "a",
+    "",
+    "   ",
+    "hi there",
+]
+
+
+@pytest.fixture
+def manager():
+    """Conversation manager backed by in-memory storage."""
+    return ConversationManager(storage=InMemoryConversationStorage())
+
+
+@pytest.fixture
+def conversation_history():
+    """Conversation history with entities from earlier requests."""
+    return [
+        {
+            "type": "user_message",
+            "text": "What does 'kippu' mean?",
+            "timestamp": "2023-05-01T12:00:00",
+            "intent": "vocabulary_help",
+            "entities": {"word": "kippu", "destination": "Odawara"}
+        },
+        {
+            "type": "assistant_message",
+            "text": "'Kippu' (切符) means 'ticket' in Japanese.",
+            "timestamp": "2023-05-01T12:00:30"
+        },
+        {
+            "type": "user_message",
+            "text": "Which line goes to the 駅?",
+            "timestamp": "2023-05-01T12:01:00",
+            "intent": "direction_guidance",
+            "entities": {"place": "駅", "line": "JR"}
+        }
+    ]
+
+
+def make_request(player_input):
+    """Create a classified request for the given input."""
+    return ClassifiedRequest(
+        request_id="test-123",
+        player_input=player_input,
+        request_type="general"
+    )
+
+
+def detect_with_pattern_loop(manager, request, conversation_history):
+    """
+    Detect the conversation state by searching each pattern in turn.
+    
+    This is the detection used before the patterns were compiled into
+    alternations, kept as the reference the compiled version must match.
+    """
+    if not conversation_history:
+        return ConversationState.NEW_TOPIC
+    
+    player_input = request.player_input.lower()
+    
+    for pattern in manager.clarification_patterns:
+        if re.search(pattern, player_input):
+            return ConversationState.CLARIFICATION
+    
+    for pattern in manager.follow_up_patterns:
+        if re.search(pattern, player_input):
+            return ConversationState.FOLLOW_UP
+    
+    for entry in conversation_history:
+        if "entities" in entry and entry["entities"]:
+            for entity_value in entry["entities"].values():
+                if isinstance(entity_value, str) and entity_value.lower() in player_input:
+                    return ConversationState.FOLLOW_UP
+    
+    return ConversationState.NEW_TOPIC
+
+
+class TestDetectConversationState:
+    """Tests for ConversationManager.detect_conversation_state."""
+    
+    @pytest.mark.parametrize("player_input", PLAYER_INPUTS)
+    def test_matches_pattern_loop(self, manager, conversation_history, player_input):
+        """Test that the compiled alternations give the same state as the per-pattern loop."""
+        request = make_request(player_input)
+        
+        expected = detect_with_pattern_loop(manager, request, conversation_history)
+        assert manager.detect_conversation_state(request, conversation_history) == expected
+    
+    @pytest.mark.parametrize("player_input", PLAYER_INPUTS)
+    def test_no_history_is_new_topic(self, manager, player_input):
+        """Test that any input without history is a new topic."""
+        request = make_request(player_input)
+        
+        assert manager.detect_conversation_state(request, []) == ConversationState.NEW_TOPIC
+    
+    @pytest.mark.parametrize("player_input, expected", [
+        ("kippu", ConversationState.FOLLOW_UP),
+        ("What time does the train to Tokyo leave?", ConversationState.NEW_TOPIC),
+        ("I don't understand", ConversationState.CLARIFICATION),
+        ("What about the JR pass?", ConversationState.FOLLOW_UP),
+        ("駅", ConversationState.FOLLOW_UP),
+        ("JR", ConversationState.FOLLOW_UP),
+        ("ok", ConversationState.NEW_TOPIC),
+        ("", ConversationState.NEW_TOPIC),
+    ])
+    def test_detected_state(self, manager, conversation_history, player_input, expected):
+        """Test the state detected for inputs with a known classification."""
+        request = make_request(player_input)
+        
+        assert manager.detect_conversation_state(request, conversation_history) == expected
+    
+    def test_short_inputs_skip_pattern_search(self, manager, conversation_history):
+        """Test that inputs shorter than three characters never reach the pattern searches."""
+        class FailingRegex:
+            def search(self, text):
+                raise AssertionError(f"pattern searched for short input {text!r}")
+        
+        manager._clarification_regex = FailingRegex()
+        manager._follow_up_regex = FailingRegex()
+        
+        for player_input in ("駅", "JR", "ok", "a", "", "   "):
+            request = make_request(player_input)
+            expected = detect_with_pattern_loop(manager, request, conversation_history)
+            assert manager.detect_conversation_state(request, conversation_history) == expected
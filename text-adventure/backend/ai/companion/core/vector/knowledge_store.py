@@ -6,18 +6,52 @@ contextual information about the Text adventure game.
 """
 
 import os
-import json
 import uuid
 import logging
+from functools import lru_cache
 from typing import List, Dict, Any, Optional, Union
 
 import chromadb
 from chromadb.utils import embedding_functions
 
 from backend.ai.companion.core.models import ClassifiedRequest
+from backend.ai.companion.utils import json_codec
 
 logger = logging.getLogger(__name__)
 
+# Number of documents embedded and added to the collection per call
+ADD_BATCH_SIZE = 64
+
+# Knowledge base entry fields that are not copied into the extra metadata
+_ENTRY_CORE_FIELDS = frozenset({"title", "type", "importance", "content"})
+
+# Rank of each document importance level when ordering search results
+_IMPORTANCE_RANKING = {"high": 3, "medium": 2, "low": 1}
+
+
+@lru_cache(maxsize=4)
+def _get_embedding_function(model_name: str):
+    """
+    Get the embedding function for a sentence-transformers model.
+    
+    Loading a model is expensive, so one embedding function is shared by all
+    knowledge stores that use the same model.
+    
+    Args:
+        model_name: Name of the sentence-transformers model
+        
+    Returns:
+        The embedding function
+    """
+    logger.debug(f"Loading embedding model: {model_name}")
+    return embedding_functions.SentenceTransformerEmbeddingFunction(model_name=model_name)
+
+
+def _result_rank(result: Dict[str, Any]) -> tuple:
+    """Get the (importance rank, score) sort key of a search result."""
+    importance = (result.get("metadata") or {}).get("importance", "medium")
+    return (_IMPORTANCE_RANKING.get(importance, 0), result.get("score", 0))
+
 
 class KnowledgeStore:
     """
@@ -51,9 +85,7 @@ class KnowledgeStore:
             self.client = chromadb.EphemeralClient()
             
         # Define the embedding function
-        self.embedding_function = embedding_functions.SentenceTransformerEmbeddingFunction(
-            model_name=embedding_model
-        )
+        self.embedding_function = _get_embedding_function(embedding_model)
         
         # Get or create the collection
         self.collection = self.client.get_or_create_collection(
@@ -121,8 +153,8 @@ class KnowledgeStore:
             return 0
         
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                knowledge_base = json.load(f)
+            with open(file_path, 'rb') as f:
+                knowledge_base = json_codec.loads(f.read())
                 
             # Transform knowledge base entries into documents
             documents = []
@@ -142,10 +174,10 @@ class KnowledgeStore:
                 
                 # Add any other metadata fields that exist
                 for key, value in entry.items():
-                    if key not in ["title", "type", "importance", "content"]:
+                    if key not in _ENTRY_CORE_FIELDS:
                         # Handle special case for lists in metadata (Chroma doesn't support them directly)
                         if isinstance(value, list):
-                            metadata[key] = json.dumps(value)
+                            metadata[key] = json_codec.dumps(value)
                         else:
                             metadata[key] = value
                 
@@ -156,12 +188,16 @@ class KnowledgeStore:
                 metadatas.append(metadata)
                 ids.append(doc_id)
             
-            # Add documents to the collection
-            self.collection.add(
-                documents=documents,
-                metadatas=metadatas,
-                ids=ids
-            )
+            # Add documents to the collection in batches so embedding runs at
+            # a bounded batch size instead of over the whole corpus at once
+            for start in range(0, len(documents), ADD_BATCH_SIZE):
+                end = start + ADD_BATCH_SIZE
+                self.collection.add(
+                    documents=documents[start:end],
+                    metadatas=metadatas[start:end],
+                    ids=ids[start:end]
+                )
+                logger.debug(f"Added documents {start + 1}-{min(end, len(documents))} of {len(documents)}")
             
             logger.info(f"Loaded {len(documents)} documents from knowledge base")
             return len(documents)
@@ -174,7 +210,8 @@ class KnowledgeStore:
         self,
         query: str,
         top_k: int = 3,
-        filters: Optional[Dict[str, Any]] = None
+        filters: Optional[Dict[str, Any]] = None,
+        query_embedding: Optional[Any] = None
     ) -> List[Dict[str, Any]]:
         """
         Search for relevant documents.
@@ -183,13 +220,19 @@ class KnowledgeStore:
             query: The search query
             top_k: Maximum number of results to return
             filters: Optional filters to apply (e.g., {"type": "language_learning"})
+            query_embedding: Optional precomputed embedding of the query, which
+                skips embedding the query text again
             
         Returns:
             List of documents with metadata and scores
         """
         # Query the collection
+        if query_embedding is not None:
+            query_args = {"query_embeddings": [query_embedding]}
+        else:
+            query_args = {"query_texts": [query]}
         results = self.collection.query(
-            query_texts=[query],
+            **query_args,
             n_results=top_k,
             where=filters,
             include=["documents", "metadatas", "distances"]
@@ -199,7 +242,7 @@ class KnowledgeStore:
         processed_results = []
         
         # Chroma DB returns results in a nested structure, handle both formats for robustness
-        if results["ids"] and len(results["ids"]) > 0:
+        if results["ids"]:
             # Get the first set of results (for the first query)
             ids = results["ids"][0] if isinstance(results["ids"][0], list) else results["ids"]
             distances = results["distances"][0] if isinstance(results["distances"][0], list) else results["distances"]
@@ -207,13 +250,15 @@ class KnowledgeStore:
             metadatas = results["metadatas"][0] if isinstance(results["metadatas"][0], list) else results["metadatas"]
             
             # Process each item in the results
-            for i in range(len(ids)):
-                processed_results.append({
-                    "id": ids[i],
-                    "document": documents[i],
-                    "metadata": metadatas[i],
-                    "score": 1.0 - distances[i]  # Convert distance to similarity score
-                })
+            processed_results = [
+                {
+                    "id": doc_id,
+                    "document": document,
+                    "metadata": metadata,
+                    "score": 1.0 - distance  # Convert distance to similarity score
+                }
+                for doc_id, document, metadata, distance in zip(ids, documents, metadatas, distances)
+            ]
         
         logger.debug(f"Found {len(processed_results)} relevant documents for query: {query}")
         return processed_results
@@ -265,27 +310,49 @@ class KnowledgeStore:
         
         # If the intent is vocabulary or grammar related, prioritize language_learning
         if request.intent and request.intent.value in ["vocabulary_help", "grammar_explanation"]:
+            queries = [enhanced_query]
+            if request.game_context and request.game_context.player_location:
+                queries.append(f"{request.game_context.player_location} in Tokyo Station")
+            
+            # Embed all queries in one batch
+            embeddings = self.embedding_function(queries)
+            
             # Get 2 language learning documents
-            language_results = self.search(enhanced_query, top_k=2, filters={"type": "language_learning"})
+            language_results = self.search(
+                enhanced_query, top_k=2, filters={"type": "language_learning"},
+                query_embedding=embeddings[0]
+            )
             
             # Get 1 location document related to the player's location
             location_filters = {"type": "location"}
             location_results = []
-            if request.game_context and request.game_context.player_location:
-                location_query = f"{request.game_context.player_location} in Tokyo Station"
-                location_results = self.search(location_query, top_k=1, filters=location_filters)
+            if len(queries) > 1:
+                location_results = self.search(
+                    queries[1], top_k=1, filters=location_filters,
+                    query_embedding=embeddings[1]
+                )
             
             # Combine the results
             results = language_results + location_results
         
         # For direction guidance, prioritize location information
         elif request.intent and request.intent.value == "direction_guidance":
+            language_query = "direction vocabulary in Japanese"
+            
+            # Embed both queries in one batch
+            embeddings = self.embedding_function([enhanced_query, language_query])
+            
             # Get 2 location documents
-            location_results = self.search(enhanced_query, top_k=2, filters={"type": "location"})
+            location_results = self.search(
+                enhanced_query, top_k=2, filters={"type": "location"},
+                query_embedding=embeddings[0]
+            )
             
             # Get 1 language learning document for direction vocabulary
-            language_query = "direction vocabulary in Japanese"
-            language_results = self.search(language_query, top_k=1, filters={"type": "language_learning"})
+            language_results = self.search(
+                language_query, top_k=1, filters={"type": "language_learning"},
+                query_embedding=embeddings[1]
+            )
             
             # Combine the results
             results = location_results + language_results
@@ -295,15 +362,7 @@ class KnowledgeStore:
             results = self.search(enhanced_query, top_k=top_k)
         
         # Sort results by importance and score
-        importance_ranking = {"high": 3, "medium": 2, "low": 1}
-        sorted_results = sorted(
-            results,
-            key=lambda x: (
-                importance_ranking.get(x.get("metadata", {}).get("importance", "medium"), 0),
-                x.get("score", 0)
-            ),
-            reverse=True
-        )
+        sorted_results = sorted(results, key=_result_rank, reverse=True)
         
         # Limit to top_k
         return sorted_results[:top_k] 
\ No newline at end of file
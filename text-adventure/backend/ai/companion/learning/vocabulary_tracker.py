@@ -5,14 +5,27 @@ This module contains the VocabularyTracker class, which is responsible for
 tracking vocabulary items and the player's progress with them.
 """
 
+import heapq
 import logging
-import json
 import os
 import time
-from typing import Dict, List, Optional, Any, Set
+from typing import Dict, FrozenSet, List, Optional, Any, Set
+
+from backend.ai.companion.utils import json_codec
 
 logger = logging.getLogger(__name__)
 
+# Time over which the recency factor of a mastery level decays, in seconds
+MASTERY_DECAY_SECONDS = 7 * 24 * 60 * 60  # One week
+
+# Shape of the recency decay, 1 - (t / MASTERY_DECAY_SECONDS) ** (1 / shape):
+# 1.0 decays linearly, lower values decay slowly at first and higher values
+# decay quickly at first
+MASTERY_DECAY_SHAPE = 1.0
+
+# Lowest recency factor an item decays to
+MASTERY_MIN_RECENCY = 0.5
+
 # Default JLPT N5 vocabulary related to train stations
 DEFAULT_VOCABULARY = {
     "切符": {
@@ -103,6 +116,10 @@ class VocabularyTracker:
         # Track player's vocabulary progress
         self.player_vocabulary = {}
         
+        # Tags used in the vocabulary, computed on first use and reset whenever
+        # vocabulary items are added or loaded
+        self._all_tags: Optional[FrozenSet[str]] = None
+        
         # Path for saving/loading data
         self.data_path = data_path
         
@@ -140,6 +157,7 @@ class VocabularyTracker:
             "tags": tags,
             "added_at": time.time()
         }
+        self._all_tags = None
         
         logger.debug(f"Added vocabulary item: {japanese} ({english})")
     
@@ -166,10 +184,15 @@ class VocabularyTracker:
             }
         
         # Update the entry
-        self.player_vocabulary[japanese]["encounters"] += 1
+        progress = self.player_vocabulary[japanese]
+        progress["encounters"] += 1
         if understood:
-            self.player_vocabulary[japanese]["understood_count"] += 1
-        self.player_vocabulary[japanese]["last_encountered"] = time.time()
+            progress["understood_count"] += 1
+        progress["last_encountered"] = time.time()
+        
+        # Store the time-independent part of the mastery level so reads only
+        # need to apply the recency factor
+        progress["base_mastery"] = self._base_mastery(progress["encounters"], progress["understood_count"])
         
         logger.debug(f"Recorded player encounter with {japanese} (understood: {understood})")
     
@@ -184,34 +207,31 @@ class VocabularyTracker:
             A dictionary with vocabulary information and player progress
         """
         # Check if the vocabulary item exists
-        if japanese not in self.vocabulary_items:
+        vocab_info = self.vocabulary_items.get(japanese)
+        if vocab_info is None:
             logger.warning(f"Attempted to get status of unknown vocabulary: {japanese}")
             return {"error": "Vocabulary item not found"}
         
-        # Get the vocabulary information
-        vocab_info = self.vocabulary_items[japanese].copy()
-        
-        # Add player progress if available
-        if japanese in self.player_vocabulary:
-            progress = self.player_vocabulary[japanese]
-            vocab_info.update({
-                "encounters": progress["encounters"],
-                "understood_count": progress["understood_count"],
-                "last_encountered": progress["last_encountered"],
-                "first_encountered": progress["first_encountered"],
-                "mastery_level": self._calculate_mastery_level(japanese)
-            })
-        else:
-            vocab_info.update({
+        # Combine the vocabulary information with player progress if available
+        progress = self.player_vocabulary.get(japanese)
+        if progress is None:
+            return {
+                **vocab_info,
                 "encounters": 0,
                 "understood_count": 0,
-                "mastery_level": 0
-            })
-        
-        # Add the Japanese word to the result
-        vocab_info["japanese"] = japanese
+                "mastery_level": 0,
+                "japanese": japanese
+            }
         
-        return vocab_info
+        return {
+            **vocab_info,
+            "encounters": progress["encounters"],
+            "understood_count": progress["understood_count"],
+            "last_encountered": progress["last_encountered"],
+            "first_encountered": progress["first_encountered"],
+            "mastery_level": self._mastery_from_progress(progress),
+            "japanese": japanese
+        }
     
     def get_all_vocabulary(self) -> List[Dict[str, Any]]:
         """
@@ -271,32 +291,44 @@ class VocabularyTracker:
         Returns:
             A list of dictionaries with vocabulary information and player progress
         """
-        # Get all vocabulary with status
-        all_vocab = []
-        
-        # First, add items that have been encountered
-        for japanese in self.player_vocabulary:
-            all_vocab.append(self.get_vocabulary_status(japanese))
-        
-        # Sort by mastery level (ascending) and then by last encountered (ascending)
+        # First, take the encountered items with the lowest mastery level and
+        # then the oldest last encounter; only the top N need to be ordered
         # This prioritizes items with low mastery that haven't been seen recently
-        all_vocab.sort(key=lambda x: (
-            x.get("mastery_level", 0),
-            x.get("last_encountered", 0) or 0
-        ))
+        # Items are ranked straight from the progress entries, so status dicts
+        # are only built for the items that are returned
+        now = time.time()
+        all_vocab = [
+            self.get_vocabulary_status(japanese)
+            for japanese in heapq.nsmallest(
+                limit, self.player_vocabulary,
+                key=lambda japanese: self._recommendation_rank(japanese, now)
+            )
+        ]
         
         # If we need more items to reach the limit, add unencountered items
-        if len(all_vocab) < limit:
-            unencountered = []
-            for japanese in self.vocabulary_items:
-                if japanese not in self.player_vocabulary:
-                    unencountered.append(self.get_vocabulary_status(japanese))
-            
-            # Add unencountered items to the result
-            all_vocab.extend(unencountered[:limit - len(all_vocab)])
+        for japanese in self.vocabulary_items:
+            if len(all_vocab) >= limit:
+                break
+            if japanese not in self.player_vocabulary:
+                all_vocab.append(self.get_vocabulary_status(japanese))
         
-        # Return the top N items
-        return all_vocab[:limit]
+        return all_vocab
+    
+    def _recommendation_rank(self, japanese: str, now: float) -> tuple:
+        """
+        Get the (mastery level, last encountered) sort key of an encountered item.
+        
+        Args:
+            japanese: The Japanese word/phrase
+            now: The current time, shared by all items being ranked
+            
+        Returns:
+            The sort key, with unknown vocabulary ranked first
+        """
+        if japanese not in self.vocabulary_items:
+            return (0, 0)
+        progress = self.player_vocabulary[japanese]
+        return (self._mastery_from_progress(progress, now), progress["last_encountered"] or 0)
     
     def get_mastery_summary(self) -> Dict[str, Any]:
         """
@@ -308,18 +340,22 @@ class VocabularyTracker:
         total_items = len(self.vocabulary_items)
         encountered_items = len(self.player_vocabulary)
         
-        # Calculate mastery levels for all encountered items
-        mastery_levels = [self._calculate_mastery_level(japanese) for japanese in self.player_vocabulary]
+        # Total and count the mastery levels of all encountered items in one pass
+        now = time.time()
+        total_mastery = 0.0
+        mastery_counts = {"high": 0, "medium": 0, "low": 0}
+        for progress in self.player_vocabulary.values():
+            level = self._mastery_from_progress(progress, now)
+            total_mastery += level
+            if level >= 0.8:
+                mastery_counts["high"] += 1
+            elif level >= 0.4:
+                mastery_counts["medium"] += 1
+            else:
+                mastery_counts["low"] += 1
         
         # Calculate average mastery level
-        avg_mastery = sum(mastery_levels) / len(mastery_levels) if mastery_levels else 0
-        
-        # Count items at different mastery levels
-        mastery_counts = {
-            "high": sum(1 for level in mastery_levels if level >= 0.8),
-            "medium": sum(1 for level in mastery_levels if 0.4 <= level < 0.8),
-            "low": sum(1 for level in mastery_levels if level < 0.4)
-        }
+        avg_mastery = total_mastery / encountered_items if encountered_items else 0
         
         return {
             "total_items": total_items,
@@ -336,10 +372,11 @@ class VocabularyTracker:
         Returns:
             A set of all tags
         """
-        tags = set()
-        for info in self.vocabulary_items.values():
-            tags.update(info.get("tags", []))
-        return tags
+        if self._all_tags is None:
+            self._all_tags = frozenset().union(
+                *(info.get("tags", ()) for info in self.vocabulary_items.values())
+            )
+        return set(self._all_tags)
     
     def save_data(self, path: Optional[str] = None) -> bool:
         """
@@ -363,7 +400,7 @@ class VocabularyTracker:
             }
             
             with open(save_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
+                f.write(json_codec.dumps(data, indent=True))
             
             logger.info(f"Saved vocabulary data to {save_path}")
             return True
@@ -387,11 +424,12 @@ class VocabularyTracker:
             return False
         
         try:
-            with open(load_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            with open(load_path, 'rb') as f:
+                data = json_codec.loads(f.read())
             
             self.vocabulary_items = data.get("vocabulary_items", {})
             self.player_vocabulary = data.get("player_vocabulary", {})
+            self._all_tags = None
             
             logger.info(f"Loaded vocabulary data from {load_path}")
             return True
@@ -399,7 +437,7 @@ class VocabularyTracker:
             logger.error(f"Failed to load vocabulary data: {e}")
             return False
     
-    def _calculate_mastery_level(self, japanese: str) -> float:
+    def _calculate_mastery_level(self, japanese: str, now: Optional[float] = None) -> float:
         """
         Calculate the mastery level for a vocabulary item.
         
@@ -409,17 +447,60 @@ class VocabularyTracker:
         
         Args:
             japanese: The Japanese word/phrase
+            now: Optional current time, defaulting to time.time()
             
         Returns:
             A mastery level between 0 and 1
         """
-        if japanese not in self.player_vocabulary:
+        progress = self.player_vocabulary.get(japanese)
+        if progress is None:
             return 0.0
         
-        progress = self.player_vocabulary[japanese]
-        encounters = progress["encounters"]
-        understood = progress["understood_count"]
+        return self._mastery_from_progress(progress, now)
+    
+    @staticmethod
+    def _mastery_from_progress(progress: Dict[str, Any], now: Optional[float] = None) -> float:
+        """
+        Calculate the mastery level from a player vocabulary progress entry.
+        
+        Args:
+            progress: The player's progress with a vocabulary item
+            now: The current time; batch callers pass one reading for all items
+            
+        Returns:
+            A mastery level between 0 and 1
+        """
+        # Data loaded from older saves has no stored base mastery
+        base_mastery = progress.get("base_mastery")
+        if base_mastery is None:
+            base_mastery = VocabularyTracker._base_mastery(progress["encounters"], progress["understood_count"])
+        
+        if base_mastery == 0:
+            return 0.0
         
+        # Adjust for recency (more recent = higher mastery)
+        if now is None:
+            now = time.time()
+        decay = (now - progress["last_encountered"]) / MASTERY_DECAY_SECONDS
+        if decay > 0:
+            decay **= 1.0 / MASTERY_DECAY_SHAPE
+        recency_factor = max(MASTERY_MIN_RECENCY, 1.0 - decay)
+        
+        # Combine factors
+        return base_mastery * recency_factor
+    
+    @staticmethod
+    def _base_mastery(encounters: int, understood: int) -> float:
+        """
+        Calculate the part of the mastery level that does not depend on time.
+        
+        Args:
+            encounters: The number of times the player encountered the item
+            understood: The number of times the player understood the item
+            
+        Returns:
+            The mastery level before the recency adjustment
+        """
         if encounters == 0:
             return 0.0
         
@@ -429,9 +510,4 @@ class VocabularyTracker:
         # Adjust for number of encounters (more encounters = more reliable mastery)
         encounter_factor = min(1.0, encounters / 5)  # Caps at 5 encounters
         
-        # Adjust for recency (more recent = higher mastery)
-        time_since_last = time.time() - progress["last_encountered"]
-        recency_factor = max(0.5, 1.0 - (time_since_last / (7 * 24 * 60 * 60)))  # Decay over a week
-        
-        # Combine factors
-        return basic_mastery * encounter_factor * recency_factor 
\ No newline at end of file
+        return basic_mastery * encounter_factor 
\ No newline at end of file
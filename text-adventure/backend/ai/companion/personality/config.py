@@ -5,11 +5,12 @@ This module contains classes for defining and managing the companion's personali
 including traits, profiles, and configuration settings.
 """
 
-import json
 import os
 import logging
 from typing import Dict, Any, List, Optional, Union, Set
 
+from backend.ai.companion.utils import json_codec
+
 logger = logging.getLogger(__name__)
 
 # Default personality profile
@@ -57,6 +58,8 @@ class PersonalityTrait:
         max_value: The maximum allowed value
     """
     
+    __slots__ = ("name", "_value", "min_value", "max_value")
+    
     def __init__(self, name: str, value: float, min_value: float = 0.0, max_value: float = 1.0):
         """
         Initialize a personality trait.
@@ -175,8 +178,9 @@ class PersonalityProfile:
         Returns:
             The trait value, or 0.5 if the trait doesn't exist
         """
-        if trait_name in self.traits:
-            return self.traits[trait_name].value
+        trait = self.traits.get(trait_name)
+        if trait is not None:
+            return trait.value
         return 0.5  # Default middle value
     
     def set_trait_value(self, trait_name: str, value: float):
@@ -187,12 +191,31 @@ class PersonalityProfile:
             trait_name: The name of the trait
             value: The new value to set
         """
-        if trait_name in self.traits:
-            self.traits[trait_name].value = value
+        trait = self.traits.get(trait_name)
+        if trait is not None:
+            trait.value = value
         else:
             # Create a new trait if it doesn't exist
             self.traits[trait_name] = PersonalityTrait(trait_name, value)
     
+    def adapt_traits(self, targets: Dict[str, float], strength: float):
+        """
+        Move several traits towards target values in one update.
+        
+        Args:
+            targets: The target value for each trait to adapt
+            strength: The adaptation strength (0-1)
+        """
+        traits = self.traits
+        for trait_name, target in targets.items():
+            trait = traits.get(trait_name)
+            if trait is None:
+                # Missing traits start from the default middle value
+                traits[trait_name] = PersonalityTrait(trait_name, 0.5 + (target - 0.5) * strength)
+            else:
+                current = trait.value
+                trait.value = current + (target - current) * strength
+    
     def to_dict(self) -> Dict[str, Any]:
         """
         Convert the profile to a dictionary representation.
@@ -350,12 +373,14 @@ class PersonalityConfig:
         """
         self.get_active_profile().set_trait_value(trait_name, value)
     
-    def save_to_file(self, file_path: str):
+    def save_to_file(self, file_path: str, indent: bool = True):
         """
         Save all profiles to a JSON file.
         
         Args:
             file_path: The path to save the file to
+            indent: Whether to pretty-print the file (default: True); callers
+                that save often can pass False for faster, compact output
         """
         data = {
             "active_profile": self._active_profile_name,
@@ -363,8 +388,8 @@ class PersonalityConfig:
         }
         
         try:
-            with open(file_path, 'w') as f:
-                json.dump(data, f, indent=2)
+            with open(file_path, 'w', encoding='utf-8') as f:
+                f.write(json_codec.dumps(data, indent=indent))
             logger.info(f"Saved personality configuration to: {file_path}")
         except Exception as e:
             logger.error(f"Failed to save personality configuration: {e}")
@@ -380,8 +405,8 @@ class PersonalityConfig:
             True if successful, False otherwise
         """
         try:
-            with open(file_path, 'r') as f:
-                data = json.load(f)
+            with open(file_path, 'rb') as f:
+                data = json_codec.loads(f.read())
             
             # Clear existing profiles (except default)
             default_profile = self._profiles.get("default")
@@ -400,6 +425,9 @@ class PersonalityConfig:
             
             logger.info(f"Loaded personality configuration from: {file_path}")
             return True
+        except FileNotFoundError:
+            logger.debug(f"No personality configuration found at: {file_path}")
+            return False
         except Exception as e:
             logger.error(f"Failed to load personality configuration: {e}")
             return False 
\ No newline at end of file
@@ -7,8 +7,9 @@ behavior and preferences.
 """
 
 import logging
-import os
 import random
+import re
+from collections import Counter
 from typing import Dict, Any, Optional, List, Tuple
 
 from backend.ai.companion.core.models import ClassifiedRequest, CompanionResponse
@@ -16,6 +17,50 @@ from backend.ai.companion.personality.config import PersonalityConfig, Personali
 
 logger = logging.getLogger(__name__)
 
+# Feedback cues for each player preference; like plain substring checks these
+# also match inside longer words (e.g. "detail" in "detailed")
+_FORMAL_FEEDBACK_RE = re.compile("formal|professional|serious")
+_CASUAL_FEEDBACK_RE = re.compile("casual|friendly|relaxed")
+_DETAILED_FEEDBACK_RE = re.compile("detail|thorough|comprehensive")
+_CONCISE_FEEDBACK_RE = re.compile("brief|concise|short")
+_HUMOROUS_FEEDBACK_RE = re.compile("funny|humor|joke")
+_SERIOUS_FEEDBACK_RE = re.compile("serious|straightforward")
+
+# Request cues for formality and detail preferences
+_FORMAL_CUES = ("please", "could you", "would you", "formal", "proper")
+_CASUAL_CUES = ("hey", "yo", "sup", "casual", "chill")
+_DETAILED_CUES = ("detail", "explain", "thorough", "comprehensive")
+_CONCISE_CUES = ("brief", "quick", "short", "simple")
+
+# Generic suggested actions for each intent category
+_SUGGESTED_ACTIONS = {
+    "VOCABULARY_HELP": (
+        "Try using this word in a sentence.",
+        "Look for this word on signs at the station.",
+        "Practice saying this word out loud."
+    ),
+    "GRAMMAR_EXPLANATION": (
+        "Try making your own sentence with this grammar pattern.",
+        "Listen for this pattern in station announcements.",
+        "Practice this pattern with different vocabulary."
+    ),
+    "DIRECTION_GUIDANCE": (
+        "Look for the station map near the ticket gates.",
+        "Check the color-coded signs for your train line.",
+        "Ask a station attendant if you're still unsure."
+    ),
+    "TRANSLATION_CONFIRMATION": (
+        "Practice saying the Japanese phrase out loud.",
+        "Try using this phrase when speaking with station staff.",
+        "Write down this phrase for future reference."
+    )
+}
+_DEFAULT_SUGGESTED_ACTIONS = (
+    "Try practicing what you've learned in a real conversation.",
+    "Look for examples of this in the train station.",
+    "Take notes to help remember this information."
+)
+
 
 class PersonalityEngine:
     """
@@ -40,8 +85,7 @@ class PersonalityEngine:
         self.config = PersonalityConfig()
         
         # Load configuration from file if provided
-        if config_path and os.path.exists(config_path):
-            self.config.load_from_file(config_path)
+        if config_path and self.config.load_from_file(config_path):
             logger.info(f"Loaded personality configuration from {config_path}")
         else:
             logger.info("Using default personality configuration")
@@ -58,7 +102,7 @@ class PersonalityEngine:
         self.interaction_count = 0
         self.positive_interactions = 0
         self.negative_interactions = 0
-        self.topic_interests = {}  # Track topics the player seems interested in
+        self.topic_interests = Counter()  # Track topics the player seems interested in
         
         logger.debug("PersonalityEngine initialized")
     
@@ -161,24 +205,26 @@ class PersonalityEngine:
         feedback_lower = feedback.lower()
         
         # Check for formality preferences
-        if any(word in feedback_lower for word in ["formal", "professional", "serious"]):
+        if _FORMAL_FEEDBACK_RE.search(feedback_lower):
             self._adjust_preference("formality_preference", 0.1)
-        elif any(word in feedback_lower for word in ["casual", "friendly", "relaxed"]):
+        elif _CASUAL_FEEDBACK_RE.search(feedback_lower):
             self._adjust_preference("formality_preference", -0.1)
         
         # Check for detail preferences
-        if any(word in feedback_lower for word in ["detail", "thorough", "comprehensive"]):
+        if _DETAILED_FEEDBACK_RE.search(feedback_lower):
             self._adjust_preference("detail_preference", 0.1)
-        elif any(word in feedback_lower for word in ["brief", "concise", "short"]):
+        elif _CONCISE_FEEDBACK_RE.search(feedback_lower):
             self._adjust_preference("detail_preference", -0.1)
         
         # Check for humor preferences
-        if any(word in feedback_lower for word in ["funny", "humor", "joke"]):
+        # "serious" is a cue for both formality and less humor
+        if _HUMOROUS_FEEDBACK_RE.search(feedback_lower):
             self._adjust_preference("humor_preference", 0.1)
-        elif any(word in feedback_lower for word in ["serious", "straightforward"]):
+        elif _SERIOUS_FEEDBACK_RE.search(feedback_lower):
             self._adjust_preference("humor_preference", -0.1)
         
-        logger.debug(f"Processed player feedback for request {request_id}: rating={rating}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Processed player feedback for request {request_id}: rating={rating}")
     
     def adapt_to_player(self, frequency: int = 10) -> bool:
         """
@@ -203,25 +249,17 @@ class PersonalityEngine:
         # (stronger adaptation early on, then more stable)
         adaptation_strength = min(0.1, 1.0 / (self.interaction_count / 10 + 1))
         
-        # Adapt formality based on player preference
-        formality_target = self.player_preferences["formality_preference"]
-        current_formality = active_profile.get_trait_value("formality")
-        new_formality = self._adapt_trait_value(current_formality, formality_target, adaptation_strength)
-        active_profile.set_trait_value("formality", new_formality)
-        
-        # Adapt enthusiasm based on positive/negative interactions
-        if self.interaction_count > 0:
-            positivity_ratio = self.positive_interactions / self.interaction_count
-            enthusiasm_target = 0.5 + (positivity_ratio - 0.5) * 0.5  # Map to 0.25-0.75 range
-            current_enthusiasm = active_profile.get_trait_value("enthusiasm")
-            new_enthusiasm = self._adapt_trait_value(current_enthusiasm, enthusiasm_target, adaptation_strength)
-            active_profile.set_trait_value("enthusiasm", new_enthusiasm)
-        
-        # Adapt playfulness based on humor preference
-        playfulness_target = self.player_preferences["humor_preference"]
-        current_playfulness = active_profile.get_trait_value("playfulness")
-        new_playfulness = self._adapt_trait_value(current_playfulness, playfulness_target, adaptation_strength)
-        active_profile.set_trait_value("playfulness", new_playfulness)
+        # Adapt formality based on player preference, enthusiasm based on
+        # positive/negative interactions and playfulness based on humor preference
+        positivity_ratio = self.positive_interactions / self.interaction_count
+        active_profile.adapt_traits(
+            {
+                "formality": self.player_preferences["formality_preference"],
+                "enthusiasm": 0.5 + (positivity_ratio - 0.5) * 0.5,  # Map to 0.25-0.75 range
+                "playfulness": self.player_preferences["humor_preference"]
+            },
+            adaptation_strength
+        )
         
         logger.info(f"Adapted personality after {self.interaction_count} interactions")
         return True
@@ -242,20 +280,15 @@ class PersonalityEngine:
         
         # Track topic interests
         if intent:
-            self.topic_interests[intent] = self.topic_interests.get(intent, 0) + 1
+            self.topic_interests[intent] += 1
         
         # Analyze the request text for personality cues
         request_text = request.player_input.lower()
         
         # Check for formality cues
-        formality_cues = {
-            "formal": ["please", "could you", "would you", "formal", "proper"],
-            "casual": ["hey", "yo", "sup", "casual", "chill"]
-        }
-        
         formality_score = 0.5  # Default neutral
-        formal_matches = sum(1 for cue in formality_cues["formal"] if cue in request_text)
-        casual_matches = sum(1 for cue in formality_cues["casual"] if cue in request_text)
+        formal_matches = sum(1 for cue in _FORMAL_CUES if cue in request_text)
+        casual_matches = sum(1 for cue in _CASUAL_CUES if cue in request_text)
         
         if formal_matches > casual_matches:
             formality_score = 0.7
@@ -263,14 +296,9 @@ class PersonalityEngine:
             formality_score = 0.3
         
         # Check for detail preference cues
-        detail_cues = {
-            "detailed": ["detail", "explain", "thorough", "comprehensive"],
-            "concise": ["brief", "quick", "short", "simple"]
-        }
-        
         detail_score = 0.5  # Default neutral
-        detailed_matches = sum(1 for cue in detail_cues["detailed"] if cue in request_text)
-        concise_matches = sum(1 for cue in detail_cues["concise"] if cue in request_text)
+        detailed_matches = sum(1 for cue in _DETAILED_CUES if cue in request_text)
+        concise_matches = sum(1 for cue in _CONCISE_CUES if cue in request_text)
         
         if detailed_matches > concise_matches:
             detail_score = 0.7
@@ -343,22 +371,8 @@ class PersonalityEngine:
         if preference in self.player_preferences:
             current = self.player_preferences[preference]
             self.player_preferences[preference] = max(0.0, min(1.0, current + adjustment))
-            logger.debug(f"Adjusted {preference} from {current} to {self.player_preferences[preference]}")
-    
-    def _adapt_trait_value(self, current: float, target: float, strength: float) -> float:
-        """
-        Adapt a trait value towards a target value with a given strength.
-        
-        Args:
-            current: The current trait value
-            target: The target trait value
-            strength: The adaptation strength (0-1)
-            
-        Returns:
-            The new trait value
-        """
-        # Move the current value towards the target by the strength amount
-        return current + (target - current) * strength
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"Adjusted {preference} from {current} to {self.player_preferences[preference]}")
     
     def _generate_suggested_actions(self, topic: Any) -> List[str]:
         """
@@ -371,33 +385,4 @@ class PersonalityEngine:
             A list of suggested actions
         """
         # Generic suggested actions based on intent category
-        if topic == "VOCABULARY_HELP":
-            return [
-                "Try using this word in a sentence.",
-                "Look for this word on signs at the station.",
-                "Practice saying this word out loud."
-            ]
-        elif topic == "GRAMMAR_EXPLANATION":
-            return [
-                "Try making your own sentence with this grammar pattern.",
-                "Listen for this pattern in station announcements.",
-                "Practice this pattern with different vocabulary."
-            ]
-        elif topic == "DIRECTION_GUIDANCE":
-            return [
-                "Look for the station map near the ticket gates.",
-                "Check the color-coded signs for your train line.",
-                "Ask a station attendant if you're still unsure."
-            ]
-        elif topic == "TRANSLATION_CONFIRMATION":
-            return [
-                "Practice saying the Japanese phrase out loud.",
-                "Try using this phrase when speaking with station staff.",
-                "Write down this phrase for future reference."
-            ]
-        else:
-            return [
-                "Try practicing what you've learned in a real conversation.",
-                "Look for examples of this in the train station.",
-                "Take notes to help remember this information."
-            ] 
\ No newline at end of file
+        return list(_SUGGESTED_ACTIONS.get(topic, _DEFAULT_SUGGESTED_ACTIONS)) 
\ No newline at end of file
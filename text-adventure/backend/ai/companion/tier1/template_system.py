@@ -7,21 +7,29 @@ with variable substitution.
 """
 
 import os
-import json
 import random
 import logging
 import re
 from typing import Dict, List, Optional, Any, Union
-from string import Formatter
 
 from backend.ai.companion.core.models import (
     ClassifiedRequest,
     IntentCategory
 )
+from backend.ai.companion.utils import json_codec
 
 logger = logging.getLogger(__name__)
 
 
+def _intent_key(intent: Union[IntentCategory, str]) -> str:
+    """Get the template key for an intent category or string key."""
+    # Plain strings are already keys; checking them for a 'value' attribute
+    # would raise and catch an AttributeError on every call
+    if type(intent) is str:
+        return intent
+    return intent.value if hasattr(intent, 'value') else str(intent)
+
+
 class TemplateSystem:
     """
     Template system for generating responses based on templates with variable substitution.
@@ -87,7 +95,8 @@ class TemplateSystem:
             # Load templates from file
             self._load_templates_from_file(template_file)
         
-        logger.debug(f"Initialized TemplateSystem with {sum(len(v) for v in self.templates.values())} templates")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Initialized TemplateSystem with {sum(len(v) for v in self.templates.values())} templates")
     
     def _load_templates_from_file(self, file_path: str) -> None:
         """
@@ -97,13 +106,13 @@ class TemplateSystem:
             file_path: Path to the JSON file containing templates
         """
         try:
-            with open(file_path, 'r') as f:
-                loaded_templates = json.load(f)
+            with open(file_path, 'rb') as f:
+                loaded_templates = json_codec.loads(f.read())
                 self.templates.update(loaded_templates)
                 logger.info(f"Loaded templates from {file_path}")
         except FileNotFoundError:
             logger.warning(f"Template file not found: {file_path}")
-        except json.JSONDecodeError:
+        except json_codec.JSONDecodeError:
             logger.error(f"Invalid JSON in template file: {file_path}")
         except Exception as e:
             logger.error(f"Error loading templates: {str(e)}")
@@ -120,7 +129,7 @@ class TemplateSystem:
             A template string
         """
         # Convert intent to string if it's an enum
-        intent_key = intent.value if hasattr(intent, 'value') else str(intent)
+        intent_key = _intent_key(intent)
         
         # Try to get context-specific templates first
         if context:
@@ -129,29 +138,45 @@ class TemplateSystem:
                 location = context['location']
                 location_key = f"{intent_key}_in_{location}"
                 if location_key in self.templates:
-                    return random.choice(self.templates[location_key])
+                    return self._choose(self.templates[location_key])
             
             # Check for formality-specific templates
             if 'formality' in context:
                 formality = context['formality']
                 formality_key = f"{intent_key}_{formality}"
                 if formality_key in self.templates:
-                    return random.choice(self.templates[formality_key])
+                    return self._choose(self.templates[formality_key])
             
             # Check for proficiency-specific templates
             if 'player_proficiency' in context:
                 proficiency = context['player_proficiency']
                 proficiency_key = f"{intent_key}_{proficiency}"
                 if proficiency_key in self.templates:
-                    return random.choice(self.templates[proficiency_key])
+                    return self._choose(self.templates[proficiency_key])
         
         # Fall back to standard templates for the intent
         if intent_key in self.templates:
-            return random.choice(self.templates[intent_key])
+            return self._choose(self.templates[intent_key])
         
         # If no templates found for the intent, use fallback templates
         logger.warning(f"No templates found for intent: {intent_key}")
-        return random.choice(self.templates["fallback"])
+        return self._choose(self.templates["fallback"])
+    
+    @staticmethod
+    def _choose(templates: List[str]) -> str:
+        """
+        Pick one template from a list at random.
+        
+        Args:
+            templates: The candidate templates
+            
+        Returns:
+            The chosen template string
+        """
+        # Most specialized categories hold a single template
+        if len(templates) == 1:
+            return templates[0]
+        return random.choice(templates)
     
     def render_template(self, template: str, variables: Dict[str, Any], context: Optional[Dict[str, Any]] = None) -> str:
         """
@@ -165,26 +190,14 @@ class TemplateSystem:
         Returns:
             The rendered template string
         """
-        # Combine variables and context
-        all_vars = {}
-        if context:
-            all_vars.update(context)
+        # Combine variables and context; format_map only looks up the fields
+        # the template uses, and SafeDict leaves any missing ones in place
+        all_vars = SafeDict(context) if context else SafeDict()
         all_vars.update(variables)
         
-        # Find all variables in the template
-        formatter = Formatter()
-        template_vars = [field_name for _, field_name, _, _ in formatter.parse(template) if field_name]
-        
-        # Create a dictionary with only the variables needed for this template
-        template_values = {}
-        for var in template_vars:
-            if var in all_vars:
-                template_values[var] = all_vars[var]
-        
         # Render the template
         try:
-            # Use format_map to handle missing keys
-            rendered = template.format_map(SafeDict(template_values))
+            rendered = template.format_map(all_vars)
             return rendered
         except Exception as e:
             logger.error(f"Error rendering template: {str(e)}")
@@ -207,7 +220,8 @@ class TemplateSystem:
         # Render the template with the request's extracted entities
         response = self.render_template(template, request.extracted_entities, context)
         
-        logger.debug(f"Processed request {request.request_id} with template")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Processed request {request.request_id} with template")
         return response
     
     def add_template(self, intent: Union[IntentCategory, str], template: str) -> None:
@@ -219,7 +233,7 @@ class TemplateSystem:
             template: The template string to add
         """
         # Convert intent to string if it's an enum
-        intent_key = intent.value if hasattr(intent, 'value') else str(intent)
+        intent_key = _intent_key(intent)
         
         # Create the intent category if it doesn't exist
         if intent_key not in self.templates:
@@ -241,7 +255,7 @@ class TemplateSystem:
             True if the template was removed, False otherwise
         """
         # Convert intent to string if it's an enum
-        intent_key = intent.value if hasattr(intent, 'value') else str(intent)
+        intent_key = _intent_key(intent)
         
         # Check if the intent category exists
         if intent_key not in self.templates:
@@ -268,8 +282,8 @@ class TemplateSystem:
             True if the templates were saved successfully, False otherwise
         """
         try:
-            with open(file_path, 'w') as f:
-                json.dump(self.templates, f, indent=2)
+            with open(file_path, 'w', encoding='utf-8') as f:
+                f.write(json_codec.dumps(self.templates, indent=True))
             logger.info(f"Saved templates to {file_path}")
             return True
         except Exception as e:
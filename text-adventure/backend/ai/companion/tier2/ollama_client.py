@@ -6,11 +6,12 @@ It handles API communication, prompt engineering, response parsing, and caching.
 """
 
 import os
-import json
+import asyncio
 import logging
 import hashlib
 import time
-from typing import Dict, List, Any, Optional, Union
+from collections import OrderedDict
+from typing import Dict, List, Any, Optional, Tuple, Union
 from datetime import datetime
 import aiohttp
 import shutil
@@ -18,9 +19,20 @@ import re
 
 from backend.ai.companion.core.models import CompanionRequest
 from backend.ai.companion.tier2.prompt_engineering import PromptEngineering
+from backend.ai.companion.utils import json_codec
 
 logger = logging.getLogger(__name__)
 
+# Connection limits for the HTTP session shared by an OllamaClient's requests
+SESSION_CONNECTION_LIMIT = 16
+SESSION_KEEPALIVE_TIMEOUT = 60  # seconds
+
+# Matches a <think>...</think> block, including its content, across lines
+_THINK_TAG_RE = re.compile(r'<think>.*?</think>', re.DOTALL)
+
+# Matches a malformed reply that is just the character name and a check mark
+_HACHI_CHECK_MARK_RE = re.compile(r'Hachi:\s*[√✓]')
+
 
 class OllamaError(Exception):
     """Exception raised for errors in the Ollama API."""
@@ -34,6 +46,16 @@ class OllamaError(Exception):
     UNKNOWN_ERROR = "unknown_error"
     INVALID_RESPONSE = "invalid_response"
     
+    # Message terms for each error type, checked in priority order
+    _ERROR_TYPE_TERMS = (
+        (CONNECTION_ERROR, ("connect", "connection", "network", "unreachable", "refused")),
+        (MODEL_ERROR, ("model", "not found", "doesn't exist")),
+        (TIMEOUT_ERROR, ("timeout", "timed out", "too long")),
+        (CONTENT_ERROR, ("content", "filter", "safety", "inappropriate")),
+        (MEMORY_ERROR, ("memory", "resources", "capacity")),
+        (INVALID_RESPONSE, ("invalid", "malformed"))
+    )
+    
     def __init__(self, message: str, error_type: str = None):
         """
         Initialize the OllamaError.
@@ -63,20 +85,11 @@ class OllamaError(Exception):
         """
         message_lower = message.lower()
         
-        if any(term in message_lower for term in ["connect", "connection", "network", "unreachable", "refused"]):
-            return self.CONNECTION_ERROR
-        elif any(term in message_lower for term in ["model", "not found", "doesn't exist"]):
-            return self.MODEL_ERROR
-        elif any(term in message_lower for term in ["timeout", "timed out", "too long"]):
-            return self.TIMEOUT_ERROR
-        elif any(term in message_lower for term in ["content", "filter", "safety", "inappropriate"]):
-            return self.CONTENT_ERROR
-        elif any(term in message_lower for term in ["memory", "resources", "capacity"]):
-            return self.MEMORY_ERROR
-        elif any(term in message_lower for term in ["invalid", "malformed"]):
-            return self.INVALID_RESPONSE
-        else:
-            return self.UNKNOWN_ERROR
+        for error_type, terms in self._ERROR_TYPE_TERMS:
+            for term in terms:
+                if term in message_lower:
+                    return error_type
+        return self.UNKNOWN_ERROR
     
     def is_transient(self) -> bool:
         """
@@ -152,8 +165,9 @@ class OllamaClient:
         # Initialize caching
         self.cache_enabled = cache_enabled
         self.cache_ttl = cache_ttl
-        self.max_cache_entries = max_cache_entries
-        self.max_cache_size_mb = max_cache_size_mb
+        # Callers passing configuration through may leave the limits unset
+        self.max_cache_entries = 1000 if max_cache_entries is None else max_cache_entries
+        self.max_cache_size_mb = 100 if max_cache_size_mb is None else max_cache_size_mb
         
         # Set up cache directory
         if cache_dir:
@@ -161,8 +175,20 @@ class OllamaClient:
         else:
             self.cache_dir = os.path.join(os.path.expanduser("~"), ".cache", "ollama_client")
         
-        # Initialize memory cache
-        self._memory_cache = {}
+        # HTTP session reused across API calls, created on first use
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._session_loop: Optional[asyncio.AbstractEventLoop] = None
+        
+        # API calls in progress by request hash, shared by concurrent requests
+        self._inflight: Dict[str, asyncio.Future] = {}
+        
+        # Initialize memory cache, kept in least recently used order
+        self._memory_cache: OrderedDict = OrderedDict()
+        
+        # Whether size_bytes covers the files left by earlier runs, and
+        # whether a prune of the disk cache is in progress
+        self._disk_size_measured = False
+        self._pruning = False
         
         # Initialize cache statistics
         self.cache_stats = {
@@ -176,11 +202,51 @@ class OllamaClient:
         }
         
         # Create cache directory if needed
-        if self.cache_enabled and not os.path.exists(self.cache_dir):
+        if self.cache_enabled:
             os.makedirs(self.cache_dir, exist_ok=True)
         
         logger.debug(f"Initialized OllamaClient with base_url={base_url}, default_model={default_model}")
     
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """
+        Get the HTTP session for API calls, creating it on first use.
+        
+        Reusing one session keeps connections to the Ollama server alive
+        between requests instead of reconnecting for every call.
+        
+        Returns:
+            The shared client session
+        """
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._session_loop is not loop:
+            # Sessions are bound to an event loop, so replace the session if
+            # the loop changed, closing the old one first
+            await self.close()
+            connector = aiohttp.TCPConnector(
+                limit=SESSION_CONNECTION_LIMIT,
+                keepalive_timeout=SESSION_KEEPALIVE_TIMEOUT
+            )
+            self._session = aiohttp.ClientSession(connector=connector)
+            self._session_loop = loop
+            logger.debug(f"Opened HTTP session for {self.base_url}")
+        return self._session
+    
+    async def close(self) -> None:
+        """Close the HTTP session used for API calls."""
+        session, self._session = self._session, None
+        self._session_loop = None
+        
+        if session is not None and not session.closed:
+            try:
+                await session.close()
+            except RuntimeError as e:
+                # Connections opened on an event loop that has since been
+                # closed can't be shut down cleanly; the session is still
+                # marked closed
+                logger.debug(f"Error closing HTTP session for {self.base_url}: {e}")
+            else:
+                logger.debug(f"Closed HTTP session for {self.base_url}")
+    
     async def generate(
         self,
         request: CompanionRequest,
@@ -214,16 +280,68 @@ class OllamaClient:
         # Hash the request for caching
         request_hash = self._hash_request(request, model)
         
-        # Check cache if enabled
-        if self.cache_enabled:
-            cached_response = self._check_cache(request_hash)
-            if cached_response:
+        if not self.cache_enabled:
+            return await self._generate_uncached(request_hash, prompt, model, temperature, max_tokens)
+        
+        # Check cache
+        cached_response = await self._check_cache(request_hash)
+        if cached_response:
+            if logger.isEnabledFor(logging.DEBUG):
                 logger.debug(f"Cache hit for request {request.request_id}")
-                return cached_response
-            else:
+            return cached_response
+        else:
+            if logger.isEnabledFor(logging.DEBUG):
                 logger.debug(f"Cache miss for request {request.request_id}")
-                self.cache_stats["misses"] += 1
+            self.cache_stats["misses"] += 1
+        
+        # Concurrent requests with the same hash would all miss the cache until
+        # the first response is saved, so they share a single API call
+        task = self._inflight.get(request_hash)
+        if task is None or task.get_loop() is not asyncio.get_running_loop():
+            task = asyncio.ensure_future(
+                self._generate_uncached(request_hash, prompt, model, temperature, max_tokens)
+            )
+            self._inflight[request_hash] = task
+            task.add_done_callback(lambda done: self._discard_inflight(request_hash, done))
+        
+        # Shield the shared call so one cancelled caller doesn't cancel it for the others
+        return await asyncio.shield(task)
+    
+    def _discard_inflight(self, request_hash: str, task: asyncio.Future) -> None:
+        """
+        Forget a finished shared API call, unless it has already been replaced.
+        
+        Args:
+            request_hash: Hash of the request
+            task: The finished API call
+        """
+        if self._inflight.get(request_hash) is task:
+            del self._inflight[request_hash]
+    
+    async def _generate_uncached(
+        self,
+        request_hash: str,
+        prompt: str,
+        model: str,
+        temperature: float,
+        max_tokens: int
+    ) -> str:
+        """
+        Generate a response with the Ollama API and cache it.
         
+        Args:
+            request_hash: Hash of the request, used as the cache key
+            prompt: The prompt to send to the model
+            model: The model to use
+            temperature: The sampling temperature
+            max_tokens: Maximum number of tokens to generate
+            
+        Returns:
+            The generated response
+            
+        Raises:
+            OllamaError: If there's an error generating the response
+        """
         try:
             # Call the Ollama API
             response = await self._call_ollama_api(
@@ -235,7 +353,7 @@ class OllamaClient:
             
             # Save to cache if enabled
             if self.cache_enabled:
-                self._save_to_cache(request_hash, response, model)
+                await self._save_to_cache(request_hash, response, model)
             
             return response
             
@@ -260,17 +378,17 @@ class OllamaClient:
             OllamaError: If there's an error getting the models
         """
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(f"{self.base_url}/api/tags") as response:
-                    if response.status != 200:
-                        error_data = await response.json()
-                        error_msg = error_data.get("error", "Unknown error")
-                        raise OllamaError(f"Failed to get available models: {error_msg}")
-                    
-                    data = await response.json()
-                    models = [model["name"] for model in data.get("models", [])]
-                    return models
-                    
+            session = await self._get_session()
+            async with session.get(f"{self.base_url}/api/tags") as response:
+                if response.status != 200:
+                    error_data = await response.json()
+                    error_msg = error_data.get("error", "Unknown error")
+                    raise OllamaError(f"Failed to get available models: {error_msg}")
+                
+                data = await response.json()
+                models = [model["name"] for model in data.get("models", [])]
+                return models
+                
         except aiohttp.ClientConnectorError as e:
             logger.error(f"Error connecting to Ollama: {e}")
             raise OllamaError(f"Failed to connect to Ollama: {str(e)}", OllamaError.CONNECTION_ERROR)
@@ -294,7 +412,10 @@ class OllamaClient:
         Returns:
             Cleaned text with thinking tags and their content removed
         """
-        return re.sub(r'<think>.*?</think>', '', text, flags=re.DOTALL).strip()
+        # Most responses have no thinking tags, so skip the regex for them
+        if '<think>' not in text:
+            return text.strip()
+        return _THINK_TAG_RE.sub('', text).strip()
         
     def _validate_response(self, response: str) -> str:
         """
@@ -316,7 +437,7 @@ class OllamaClient:
             raise OllamaError("Response too short or empty", OllamaError.INVALID_RESPONSE)
             
         # Check for responses that just contain the character name and a check mark
-        if re.search(r'Hachi:\s*[√✓]', response):
+        if _HACHI_CHECK_MARK_RE.search(response):
             raise OllamaError("Malformed response with check mark", OllamaError.INVALID_RESPONSE)
             
         # Check for responses that are just repeating "Hachi:" multiple times
@@ -366,61 +487,50 @@ class OllamaClient:
         }
         
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(f"{self.base_url}/api/generate", json=payload, timeout=60) as response:
-                    if response.status != 200:
-                        error_data = await response.json()
-                        error_msg = error_data.get("error", "Unknown error")
-                        
-                        # Determine error type based on the error message
-                        if "not found" in error_msg.lower() or "doesn't exist" in error_msg.lower():
-                            raise OllamaError(f"Failed to generate response: {error_msg}", OllamaError.MODEL_ERROR)
-                        elif "memory" in error_msg.lower() or "resources" in error_msg.lower():
-                            raise OllamaError(f"Failed to generate response: {error_msg}", OllamaError.MEMORY_ERROR)
-                        else:
-                            raise OllamaError(f"Failed to generate response: {error_msg}")
+            session = await self._get_session()
+            async with session.post(f"{self.base_url}/api/generate", json=payload, timeout=60) as response:
+                if response.status != 200:
+                    error_data = await response.json()
+                    error_msg = error_data.get("error", "Unknown error")
                     
-                    # Handle both regular JSON and streaming ndjson responses
-                    content_type = response.headers.get('content-type', '')
-                    response_text = await response.text()
+                    # Determine error type based on the error message
+                    error_lower = error_msg.lower()
+                    if "not found" in error_lower or "doesn't exist" in error_lower:
+                        raise OllamaError(f"Failed to generate response: {error_msg}", OllamaError.MODEL_ERROR)
+                    elif "memory" in error_lower or "resources" in error_lower:
+                        raise OllamaError(f"Failed to generate response: {error_msg}", OllamaError.MEMORY_ERROR)
+                    else:
+                        raise OllamaError(f"Failed to generate response: {error_msg}")
+                
+                # Handle both regular JSON and streaming ndjson responses
+                content_type = response.headers.get('content-type', '')
+                
+                if 'application/x-ndjson' in content_type:
+                    # Handle streaming response format (even though we requested non-streaming)
+                    logger.debug("Received ndjson streaming response despite requesting non-streaming mode")
                     
-                    if 'application/x-ndjson' in content_type:
-                        # Handle streaming response format (even though we requested non-streaming)
-                        logger.debug("Received ndjson streaming response despite requesting non-streaming mode")
-                        
-                        # Extract all JSON objects and concatenate the responses
-                        json_lines = [line for line in response_text.strip().split('\n') if line.strip()]
-                        if not json_lines:
-                            raise OllamaError("Empty response received from Ollama API", OllamaError.CONTENT_ERROR)
-                        
-                        # Combine all response fragments into a complete response
-                        complete_response = ""
-                        for line in json_lines:
-                            try:
-                                obj = json.loads(line)
-                                partial_response = obj.get("response", "")
-                                complete_response += partial_response
-                            except json.JSONDecodeError as e:
-                                logger.warning(f"Failed to parse JSON line in ndjson response: {e}")
-                        
+                    # Combine the response fragments as the lines arrive
+                    complete_response = await self._read_ndjson_response(response)
+                    
+                    # Clean the response by removing thinking tags if present
+                    clean_response = self._remove_thinking_tags(complete_response)
+                    
+                    # Validate the response before returning
+                    return self._validate_response(clean_response)
+                else:
+                    # Handle regular JSON response
+                    response_body = await response.read()
+                    try:
+                        data = json_codec.loads(response_body)
+                        response = data.get("response", "")
                         # Clean the response by removing thinking tags if present
-                        clean_response = self._remove_thinking_tags(complete_response)
+                        clean_response = self._remove_thinking_tags(response)
                         
                         # Validate the response before returning
                         return self._validate_response(clean_response)
-                    else:
-                        # Handle regular JSON response
-                        try:
-                            data = json.loads(response_text)
-                            response = data.get("response", "")
-                            # Clean the response by removing thinking tags if present
-                            clean_response = self._remove_thinking_tags(response)
-                            
-                            # Validate the response before returning
-                            return self._validate_response(clean_response)
-                        except json.JSONDecodeError as e:
-                            raise OllamaError(f"Invalid JSON response: {str(e)}", OllamaError.CONTENT_ERROR)
-                    
+                    except json_codec.JSONDecodeError as e:
+                        raise OllamaError(f"Invalid JSON response: {str(e)}", OllamaError.CONTENT_ERROR)
+                
         except Exception as e:
             logger.error(f"Error calling Ollama API: {e}")
             
@@ -432,10 +542,73 @@ class OllamaClient:
             else:
                 raise OllamaError(f"Failed to communicate with Ollama: {str(e)}")
     
-    def _check_cache(self, request_hash: str) -> Optional[str]:
+    async def _read_ndjson_response(self, response: aiohttp.ClientResponse) -> str:
+        """
+        Read a streamed ndjson response and combine its response fragments.
+        
+        Lines are parsed as the body arrives rather than after buffering all of
+        it. Chunks are split on newlines by hand because the final line, which
+        carries the token context, can exceed aiohttp's readline limit.
+        
+        Args:
+            response: The streamed API response
+            
+        Returns:
+            The complete response text
+            
+        Raises:
+            OllamaError: If the response contains no JSON lines
+        """
+        fragments = []
+        line_count = 0
+        pending = bytearray()
+        
+        async for chunk in response.content.iter_any():
+            pending += chunk
+            end = pending.rfind(b"\n")
+            if end < 0:
+                continue
+            
+            # Parse the complete lines and keep any partial line for the next chunk
+            lines = pending[:end].split(b"\n")
+            del pending[:end + 1]
+            line_count += self._collect_ndjson_fragments(lines, fragments)
+        
+        line_count += self._collect_ndjson_fragments([pending], fragments)
+        if not line_count:
+            raise OllamaError("Empty response received from Ollama API", OllamaError.CONTENT_ERROR)
+        
+        return "".join(fragments)
+    
+    def _collect_ndjson_fragments(self, lines: List[bytes], fragments: List[str]) -> int:
+        """
+        Parse ndjson lines and append their response fragments.
+        
+        Args:
+            lines: The raw lines to parse
+            fragments: The list to append the response fragments to
+            
+        Returns:
+            The number of non-blank lines
+        """
+        count = 0
+        for line in lines:
+            if not line.strip():
+                continue
+            count += 1
+            try:
+                fragments.append(json_codec.loads(line).get("response", ""))
+            except json_codec.JSONDecodeError as e:
+                logger.warning(f"Failed to parse JSON line in ndjson response: {e}")
+        return count
+    
+    async def _check_cache(self, request_hash: str) -> Optional[str]:
         """
         Check both memory and disk cache for a response.
         
+        The disk cache is read in a worker thread so file I/O doesn't block
+        the event loop.
+        
         Args:
             request_hash: Hash of the request
             
@@ -455,18 +628,19 @@ class OllamaClient:
                 del self._memory_cache[request_hash]
             else:
                 # Memory cache hit
+                self._memory_cache.move_to_end(request_hash)
                 self.cache_stats["hits"] += 1
                 self.cache_stats["memory_hits"] += 1
                 return cache_entry["response"]
         
         # Then check disk cache
-        disk_response = self._get_from_cache(request_hash)
+        disk_response = await asyncio.to_thread(self._get_from_cache, request_hash)
         if disk_response:
             # Disk cache hit - add to memory cache for faster access next time
-            self._memory_cache[request_hash] = {
+            self._add_to_memory_cache(request_hash, {
                 "response": disk_response,
                 "timestamp": time.time()
-            }
+            })
             self.cache_stats["hits"] += 1
             self.cache_stats["disk_hits"] += 1
             return disk_response
@@ -475,6 +649,24 @@ class OllamaClient:
         self.cache_stats["misses"] += 1
         return None
     
+    def _add_to_memory_cache(self, request_hash: str, cache_entry: Dict[str, Any]) -> None:
+        """
+        Add an entry to the memory cache, evicting the least recently used
+        entries beyond max_cache_entries.
+        
+        Evicted entries stay in the disk cache.
+        
+        Args:
+            request_hash: Hash of the request
+            cache_entry: The cache entry to store
+        """
+        self._memory_cache[request_hash] = cache_entry
+        self._memory_cache.move_to_end(request_hash)
+        
+        while len(self._memory_cache) > self.max_cache_entries:
+            self._memory_cache.popitem(last=False)
+            self.cache_stats["evictions"] += 1
+    
     def _is_cache_entry_expired(self, cache_entry: Dict[str, Any]) -> bool:
         """
         Check if a cache entry is expired based on TTL.
@@ -504,12 +696,9 @@ class OllamaClient:
             
         cache_file = os.path.join(self.cache_dir, f"{request_hash}.json")
         
-        if not os.path.exists(cache_file):
-            return None
-            
         try:
-            with open(cache_file, 'r') as f:
-                cache_data = json.load(f)
+            with open(cache_file, 'rb') as f:
+                cache_data = json_codec.loads(f.read())
             
             # Check if the cache entry is still valid
             timestamp = cache_data.get("timestamp", 0)
@@ -523,14 +712,19 @@ class OllamaClient:
                 
             return cache_data.get("response")
             
+        except FileNotFoundError:
+            return None
         except Exception as e:
             logger.warning(f"Error reading from cache: {e}")
             return None
     
-    def _save_to_cache(self, request_hash: str, response: str, model: str) -> None:
+    async def _save_to_cache(self, request_hash: str, response: str, model: str) -> None:
         """
         Save a response to both memory and disk cache.
         
+        The disk cache file is written in a worker thread so file I/O doesn't
+        block the event loop.
+        
         Args:
             request_hash: Hash of the request
             response: The response to cache
@@ -543,11 +737,11 @@ class OllamaClient:
         timestamp = time.time()
         
         # Save to memory cache
-        self._memory_cache[request_hash] = {
+        self._add_to_memory_cache(request_hash, {
             "response": response,
             "timestamp": timestamp,
             "model": model
-        }
+        })
         
         # Update cache stats
         self.cache_stats["insertions"] += 1
@@ -563,122 +757,116 @@ class OllamaClient:
                 "timestamp": timestamp
             }
             
-            with open(cache_file, 'w') as f:
-                json.dump(cache_data, f)
+            encoded = json_codec.dumps(cache_data).encode('utf-8')
+            await asyncio.to_thread(self._write_cache_file, cache_file, encoded)
             
             # Update cache size stats
-            file_size = os.path.getsize(cache_file)
-            self.cache_stats["size_bytes"] += file_size
+            self.cache_stats["size_bytes"] += len(encoded)
+            await self._prune_cache_if_needed()
                 
-            logger.debug(f"Saved response to cache for hash {request_hash}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"Saved response to cache for hash {request_hash}")
             
         except Exception as e:
             logger.warning(f"Error saving to cache: {e}")
     
-    def _prune_cache_if_needed(self) -> None:
-        """
-        Prune the cache if it exceeds size or entry limits.
+    @staticmethod
+    def _write_cache_file(cache_file: str, data: bytes) -> None:
         """
-        if not self.cache_enabled:
-            return
+        Write an encoded entry to a disk cache file.
         
-        # Check if we've exceeded the maximum number of entries
-        if len(self._memory_cache) > self.max_cache_entries:
-            logger.debug(f"Cache entries ({len(self._memory_cache)}) exceeded limit ({self.max_cache_entries}), pruning...")
-            self._prune_cache_by_age()
-        
-        # Check if we've exceeded the maximum cache size
-        cache_size_mb = self.cache_stats["size_bytes"] / (1024 * 1024)
-        if cache_size_mb > self.max_cache_size_mb:
-            logger.debug(f"Cache size ({cache_size_mb:.2f} MB) exceeded limit ({self.max_cache_size_mb} MB), pruning...")
-            self._prune_cache_by_size()
+        Args:
+            cache_file: Path of the cache file
+            data: The encoded cache entry
+        """
+        with open(cache_file, 'wb') as f:
+            f.write(data)
     
-    def _prune_cache_by_age(self) -> None:
+    async def _prune_cache_if_needed(self) -> None:
         """
-        Prune the oldest entries from the cache.
+        Prune the disk cache if it exceeds the size limit.
+        
+        The cache files are listed and removed in a worker thread so file I/O
+        doesn't block the event loop. The first call also measures the files
+        left by earlier runs, since the size tracked in cache_stats only
+        counts files written by this client.
         """
-        if not self._memory_cache:
+        if not self.cache_enabled or self._pruning:
             return
         
-        # Sort entries by timestamp
-        sorted_entries = sorted(
-            self._memory_cache.items(),
-            key=lambda x: x[1].get("timestamp", 0)
-        )
+        max_bytes = self.max_cache_size_mb * 1024 * 1024
+        if self._disk_size_measured and self.cache_stats["size_bytes"] <= max_bytes:
+            return
         
-        # Remove the oldest third of entries
-        entries_to_remove = len(sorted_entries) // 3
-        if entries_to_remove < 1:
-            entries_to_remove = 1
+        self._pruning = True
+        try:
+            removed, size_bytes = await asyncio.to_thread(self._prune_cache_files, max_bytes)
+        except Exception as e:
+            logger.warning(f"Error pruning cache: {e}")
+            return
+        finally:
+            self._pruning = False
         
-        for i in range(entries_to_remove):
-            request_hash, _ = sorted_entries[i]
-            
-            # Remove from memory cache
-            if request_hash in self._memory_cache:
-                del self._memory_cache[request_hash]
-            
-            # Remove from disk cache
-            cache_file = os.path.join(self.cache_dir, f"{request_hash}.json")
-            if os.path.exists(cache_file):
-                try:
-                    file_size = os.path.getsize(cache_file)
-                    os.remove(cache_file)
-                    self.cache_stats["size_bytes"] -= file_size
-                except Exception as e:
-                    logger.warning(f"Error removing cache file: {e}")
+        # Responses whose files were removed are dropped from memory as well
+        for request_hash in removed:
+            self._memory_cache.pop(request_hash, None)
         
-        # Update cache stats
-        self.cache_stats["entries"] = len(self._memory_cache)
-        logger.debug(f"Pruned {entries_to_remove} entries from cache")
+        self.cache_stats["size_bytes"] = size_bytes
+        self._disk_size_measured = True
+        if removed:
+            logger.debug(f"Pruned {len(removed)} entries, cache is now {size_bytes / (1024 * 1024):.2f} MB")
     
-    def _prune_cache_by_size(self) -> None:
-        """
-        Prune the cache to reduce its size.
+    def _prune_cache_files(self, max_bytes: float) -> Tuple[List[str], int]:
         """
-        if not os.path.exists(self.cache_dir):
-            return
+        Remove the oldest disk cache files if the cache exceeds a size.
         
+        Files are removed until the cache is down to 80% of the limit. This
+        runs in a worker thread and must not touch the memory cache.
+        
+        Args:
+            max_bytes: The maximum total size of the cache files
+            
+        Returns:
+            The request hashes of the removed files and the remaining size
+        """
         # Get all cache files with their sizes and timestamps
         cache_files = []
-        for filename in os.listdir(self.cache_dir):
-            if filename.endswith(".json"):
-                file_path = os.path.join(self.cache_dir, filename)
-                try:
-                    size = os.path.getsize(file_path)
-                    mtime = os.path.getmtime(file_path)
-                    cache_files.append((filename, size, mtime))
-                except Exception as e:
-                    logger.warning(f"Error getting file info: {e}")
-        
-        # Sort by modification time (oldest first)
+        try:
+            with os.scandir(self.cache_dir) as it:
+                for dir_entry in it:
+                    if dir_entry.name.endswith(".json"):
+                        try:
+                            stat = dir_entry.stat()
+                            cache_files.append((dir_entry.name, stat.st_size, stat.st_mtime))
+                        except OSError as e:
+                            logger.warning(f"Error getting file info: {e}")
+        except FileNotFoundError:
+            return [], 0
+        
+        current_size = sum(size for _, size, _ in cache_files)
+        if current_size <= max_bytes:
+            return [], current_size
+        
+        # Remove files, oldest first, until we're under the target
         cache_files.sort(key=lambda x: x[2])
-        
-        # Remove files until we're under the limit
-        target_size = self.max_cache_size_mb * 1024 * 1024 * 0.8  # Target 80% of max
-        current_size = self.cache_stats["size_bytes"]
+        target_size = max_bytes * 0.8
+        removed = []
         
         for filename, size, _ in cache_files:
             if current_size <= target_size:
                 break
-                
-            file_path = os.path.join(self.cache_dir, filename)
+            
             try:
-                os.remove(file_path)
-                current_size -= size
-                
-                # Also remove from memory cache if present
-                request_hash = filename.replace(".json", "")
-                if request_hash in self._memory_cache:
-                    del self._memory_cache[request_hash]
-                    
-            except Exception as e:
+                os.remove(os.path.join(self.cache_dir, filename))
+            except FileNotFoundError:
+                pass
+            except OSError as e:
                 logger.warning(f"Error removing cache file: {e}")
+                continue
+            current_size -= size
+            removed.append(filename[:-len(".json")])
         
-        # Update cache stats
-        self.cache_stats["size_bytes"] = current_size
-        self.cache_stats["entries"] = len(self._memory_cache)
-        logger.debug(f"Pruned cache to {current_size / (1024 * 1024):.2f} MB")
+        return removed, current_size
     
     def clear_cache(self) -> None:
         """
@@ -0,0 +1,100 @@
+"""
+Text Adventure - Tests for OllamaClient
+
+This module tests the response cache of the Ollama client, which keeps recent
+responses in memory in least recently used order, evicts the oldest ones beyond
+a configured number of entries, and prunes the disk cache to a size limit.
+"""
+
+import os
+import threading
+
+import pytest
+
+from backend.ai.companion.tier2.ollama_client import OllamaClient
+
+
+@pytest.fixture
+def cache_dir(tmp_path):
+    """Temporary directory for the disk cache."""
+    return str(tmp_path / "ollama_cache")
+
+
+class TestOllamaClientCache:
+    """Tests for the OllamaClient response cache."""
+    
+    def test_max_cache_entries_defaults_when_none(self, cache_dir):
+        """Test that an unset entry limit falls back to the default."""
+        client = OllamaClient(cache_dir=cache_dir, max_cache_entries=None)
+        assert client.max_cache_entries == 1000
+    
+    def test_memory_cache_evicts_least_recently_used(self, cache_dir):
+        """Test that the memory cache evicts the least recently used entries."""
+        client = OllamaClient(cache_dir=cache_dir, max_cache_entries=2)
+        
+        client._add_to_memory_cache("a", {"response": "A", "timestamp": 0})
+        client._add_to_memory_cache("b", {"response": "B", "timestamp": 0})
+        # Re-adding "a" makes it the most recently used entry
+        client._add_to_memory_cache("a", {"response": "A", "timestamp": 0})
+        client._add_to_memory_cache("c", {"response": "C", "timestamp": 0})
+        
+        assert list(client._memory_cache) == ["a", "c"]
+        assert client.cache_stats["evictions"] == 1
+    
+    @pytest.mark.asyncio
+    async def test_cache_hits_refresh_recency(self, cache_dir):
+        """Test that a memory cache hit protects the entry from eviction."""
+        client = OllamaClient(cache_dir=cache_dir, max_cache_entries=2)
+        
+        await client._save_to_cache("a", "A", "llama3")
+        await client._save_to_cache("b", "B", "llama3")
+        assert await client._check_cache("a") == "A"
+        await client._save_to_cache("c", "C", "llama3")
+        
+        assert list(client._memory_cache) == ["a", "c"]
+        assert client.cache_stats["evictions"] == 1
+        assert client.cache_stats["memory_hits"] == 1
+    
+    @pytest.mark.asyncio
+    async def test_save_with_unset_limit(self, cache_dir):
+        """Test that saving to the cache works when the entry limit is unset."""
+        client = OllamaClient(cache_dir=cache_dir, max_cache_entries=None)
+        
+        await client._save_to_cache("a", "A", "llama3")
+        
+        assert await client._check_cache("a") == "A"
+        assert client.cache_stats["evictions"] == 0
+    
+    @pytest.mark.asyncio
+    async def test_save_prunes_oldest_disk_files(self, cache_dir):
+        """Test that saving prunes the oldest cache files in a worker thread."""
+        os.makedirs(cache_dir)
+        for i in range(10):
+            path = os.path.join(cache_dir, f"old{i}.json")
+            with open(path, "wb") as f:
+                f.write(b" " * 200)
+            os.utime(path, (1000 + i, 1000 + i))
+        
+        client = OllamaClient(cache_dir=cache_dir, max_cache_size_mb=0.001)
+        client._add_to_memory_cache("old0", {"response": "stale", "timestamp": 0})
+        
+        prune_threads = []
+        prune_cache_files = client._prune_cache_files
+        
+        def record_thread(max_bytes):
+            prune_threads.append(threading.get_ident())
+            return prune_cache_files(max_bytes)
+        
+        client._prune_cache_files = record_thread
+        
+        await client._save_to_cache("new", "N", "llama3")
+        
+        remaining = sorted(os.listdir(cache_dir))
+        disk_size = sum(os.path.getsize(os.path.join(cache_dir, name)) for name in remaining)
+        assert "new.json" in remaining
+        assert "old0.json" not in remaining
+        assert "old9.json" in remaining
+        assert disk_size <= 0.001 * 1024 * 1024 * 0.8
+        assert client.cache_stats["size_bytes"] == disk_size
+        assert "old0" not in client._memory_cache
+        assert prune_threads and prune_threads[0] != threading.get_ident()
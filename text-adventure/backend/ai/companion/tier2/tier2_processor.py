@@ -105,6 +105,11 @@ class Tier2Processor(Processor):
         
         logger.debug("Initialized Tier2Processor with common components")
     
+    async def close(self) -> None:
+        """Close the Ollama client's HTTP session."""
+        if getattr(self, 'ollama_client', None) is not None:
+            await self.ollama_client.close()
+    
     async def process(self, request: ClassifiedRequest) -> str:
         """
         Process a request with the Tier 2 processor.
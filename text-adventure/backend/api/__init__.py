@@ -2,9 +2,30 @@
 API package for the Text Adventure game.
 """
 
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
 from fastapi import FastAPI
 from backend.api.routers import api_router
 from backend.api.middleware import setup_middleware
+from backend.ai.companion.core.processor_framework import ProcessorFactory
+from backend.ai.companion.core.storage.factory import default_storage_factory
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    """
+    Run the application, releasing shared resources on shutdown.
+    
+    Closes pooled storage connections and then processor connections, such as
+    the Ollama HTTP session.
+    
+    Args:
+        app: The FastAPI application
+    """
+    yield
+    await default_storage_factory.close_all()
+    await ProcessorFactory.close_all()
 
 
 def create_app() -> FastAPI:
@@ -21,7 +42,8 @@ def create_app() -> FastAPI:
         version="0.1.0",
         docs_url="/api/docs",
         redoc_url="/api/redoc",
-        openapi_url="/api/openapi.json"
+        openapi_url="/api/openapi.json",
+        lifespan=lifespan
     )
     
     # Set up middleware
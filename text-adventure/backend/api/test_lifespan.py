@@ -0,0 +1,62 @@
+"""
+Text Adventure - Tests for the API lifespan
+
+This module tests that shutting down the FastAPI application closes pooled
+storage connections and processor HTTP sessions.
+"""
+
+import warnings
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backend.api import create_app
+from backend.ai.companion.core.models import ProcessingTier
+from backend.ai.companion.core.processor_framework import ProcessorFactory
+from backend.ai.companion.core.storage.config import StorageType
+from backend.ai.companion.core.storage.factory import default_storage_factory
+from backend.ai.companion.tier2.tier2_processor import Tier2Processor
+
+
+@pytest.fixture
+def sqlite_config(tmp_path):
+    """Storage configuration for a temporary SQLite database."""
+    return {
+        "type": StorageType.SQLITE,
+        "sqlite": {"database_path": str(tmp_path / "conversations.db")}
+    }
+
+
+def test_create_app_has_no_deprecated_event_handlers():
+    """Test that creating the app does not register deprecated on_event handlers."""
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", DeprecationWarning)
+        create_app()
+
+
+def test_shutdown_closes_storage_and_processors(sqlite_config, tmp_path, monkeypatch):
+    """Test that shutting down the app closes storage pools and HTTP sessions."""
+    # Create the storage first so the processor shares it instead of opening
+    # the default database
+    monkeypatch.setattr(default_storage_factory, "_storage_instances", {})
+    storage = default_storage_factory.get_storage(sqlite_config)
+    
+    monkeypatch.setattr(ProcessorFactory, "_processors", {})
+    processor = Tier2Processor()
+    processor.ollama_client.cache_dir = str(tmp_path / "ollama_cache")
+    ProcessorFactory._processors[ProcessingTier.TIER_2] = processor
+    
+    with TestClient(create_app()) as client:
+        assert client.get("/health").json() == {"status": "ok"}
+        
+        # Open the pool and the session on the application's event loop
+        client.portal.call(storage.get_context, "conv-1")
+        session = client.portal.call(processor.ollama_client._get_session)
+        assert storage._connections
+        assert not session.closed
+    
+    assert storage._connections == []
+    assert storage._pool is None
+    assert session.closed
+    assert processor.ollama_client._session is None
+    assert ProcessorFactory._processors == {}